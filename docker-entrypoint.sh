@@ -39,5 +39,5 @@ else
 fi
 
 # Start the web server
-echo "🚀 Starting WebUIFlasher server on http://0.0.0.0:8000"
+echo "🚀 Starting WebUIFlasher server on http://${WEBFLASHER_HOST:-0.0.0.0}:${WEBFLASHER_PORT:-8000}"
 exec uv run scripts/webflasher.py
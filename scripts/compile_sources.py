@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Sources Compiler
+
+Converts sources.yaml into an importable Python module (<sources>_compiled.py
+next to it) containing a literal SOURCES dict. The flash tools load this
+module instead of parsing the YAML file as long as the YAML file is unchanged
+(same mtime and size as when it was compiled).
+
+Usage:
+    compile_sources.py [--sources=<file>]
+    compile_sources.py --help
+
+Options:
+    -s --sources=<file>    Path to sources.yaml file [default: sources.yaml]
+    -h --help              Show this help message
+
+Examples:
+    uv run scripts/compile_sources.py
+    uv run scripts/compile_sources.py --sources=test-sources.yaml
+"""
+
+import sys
+
+import yaml
+from docopt import docopt
+from flash_utils.config import compile_sources_config
+
+
+def main():
+    """Main entry point."""
+    args = docopt(__doc__)
+
+    try:
+        output_path = compile_sources_config(args["--sources"])
+    except FileNotFoundError:
+        print(f"❌ Sources file not found: {args['--sources']}")
+        sys.exit(1)
+    except yaml.YAMLError as e:
+        print(f"❌ Error parsing sources file: {e}")
+        sys.exit(1)
+
+    print(f"✅ Compiled sources written to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,8 @@ flashes the corresponding .bin file.
 
 Usage:
     flash_firmware.py [<name>] [--port=<port>] [--sources=<file>]
-                      [--baudrate=<rate>] [--loop]
+                      [--baudrate=<rate>] [--loop] [--reuse-port]
+                      [--subprocess]
     flash_firmware.py --list [--sources=<file>]
     flash_firmware.py --help
 
@@ -20,6 +21,9 @@ Options:
     -s --sources=<file>    Path to sources.yaml file [default: sources.yaml]
     -b --baudrate=<rate>   Baud rate for flashing [default: 921600]
     -l --loop              Continue flashing after each device (for batch production)
+    --reuse-port           In loop mode, keep the serial connection open between
+                           devices (requires --port and identical boards)
+    --subprocess           Run esptool as a separate process (for debugging)
     --list                 List available firmware names
     -h --help              Show this help message
 
@@ -31,66 +35,96 @@ Examples:
     uv run scripts/flash_firmware.py --list
 """
 
+import contextlib
+import os
+import select
 import sys
+from collections.abc import Iterator
 
 from docopt import docopt
 from flash_utils import flash_firmware, load_sources_config
 from flash_utils.config import list_available_firmware
+from flash_utils.esptool_runner import close_reused_port, reuse_port, use_subprocess
 
 
-def wait_for_user_input() -> bool:
-    """Wait for user input and return True to continue, False to stop."""
-    print("\n" + "━" * 60)
-    print("🔄 Batch Production Mode")
-    print("━" * 60)
-    print("📱 Connect next device and press any key to continue...")
-    print("🛑 Press 'ESC' or 'n' to stop")
-    print("━" * 60)
+@contextlib.contextmanager
+def cbreak_stdin() -> Iterator[bool]:
+    """Put stdin into cbreak mode for the duration of the block.
 
+    Yields True if single-key input is available, False if stdin is not a
+    TTY or termios is unsupported (the caller then falls back to input()).
+    """
     try:
-        # Try to use termios for better key detection (Unix/Linux)
         import termios
         import tty
+    except ImportError:
+        yield False
+        return
 
+    try:
         # Check if stdin is a real terminal (not a pipe or redirect)
         if not sys.stdin.isatty():
-            raise ImportError("Not a TTY")
+            raise OSError("Not a TTY")
 
-        old_settings = termios.tcgetattr(sys.stdin)
-        try:
-            # Try modern method first, then fall back to older method
-            if hasattr(tty, "setcbreak"):
-                tty.setcbreak(sys.stdin.fileno())
-            else:
-                tty.cbreak(sys.stdin.fileno())
-            key = sys.stdin.read(1)
+        fd = sys.stdin.fileno()
+        old_settings = termios.tcgetattr(fd)
+        # Try modern method first, then fall back to older method
+        if hasattr(tty, "setcbreak"):
+            tty.setcbreak(fd)
+        else:
+            tty.cbreak(fd)
+    except (OSError, termios.error):
+        yield False
+        return
 
-            # Check for ESC key (ASCII 27) or 'n'/'N' to stop
-            if ord(key) == 27 or key.lower() == "n":
-                print("🛑 Stopping batch production...")
-                return False
-            else:
-                print(f"🚀 Continuing with next device... (pressed: {repr(key)})")
-                return True
+    try:
+        yield True
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
 
-        finally:
-            termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
 
-    except (ImportError, OSError, termios.error):
-        # Fallback for systems without termios or when not in a TTY
-        try:
-            user_input = (
-                input("Press ENTER to continue or 'n' to stop: ").strip().lower()
-            )
-            if user_input == "n":
-                print("🛑 Stopping batch production...")
-                return False
-            else:
-                print("🚀 Continuing with next device...")
-                return True
-        except (EOFError, KeyboardInterrupt):
-            print("\n🛑 Stopping batch production...")
+def wait_for_user_input(cbreak: bool = False) -> bool:
+    """Wait for user input and return True to continue, False to stop.
+
+    Args:
+        cbreak: True if stdin is already in cbreak mode (see cbreak_stdin)
+    """
+    print("\n" + "━" * 60)
+    print("🔄 Batch Production Mode")
+    print("━" * 60)
+    print("📱 Connect next device and press any key to continue...")
+    print("🛑 Press 'ESC' or 'n' to stop")
+    print("━" * 60)
+
+    if cbreak:
+        import termios
+
+        fd = sys.stdin.fileno()
+        # Drop keys pressed while the previous device was flashing
+        termios.tcflush(fd, termios.TCIFLUSH)
+        select.select([fd], [], [])
+        key = os.read(fd, 1)
+
+        # Check for ESC key (ASCII 27) or 'n'/'N' to stop
+        if not key or key == b"\x1b" or key.lower() == b"n":
+            print("🛑 Stopping batch production...")
             return False
+        pressed = key.decode(errors="replace")
+        print(f"🚀 Continuing with next device... (pressed: {pressed!r})")
+        return True
+
+    # Fallback for systems without termios or when not in a TTY
+    try:
+        user_input = input("Press ENTER to continue or 'n' to stop: ").strip().lower()
+        if user_input == "n":
+            print("🛑 Stopping batch production...")
+            return False
+        else:
+            print("🚀 Continuing with next device...")
+            return True
+    except (EOFError, KeyboardInterrupt):
+        print("\n🛑 Stopping batch production...")
+        return False
 
 
 def main():
@@ -112,37 +146,55 @@ def main():
     port = args["--port"]
     baudrate = int(args["--baudrate"])
     loop_mode = args["--loop"]
+    use_subprocess(args["--subprocess"])
 
     # Handle loop mode for batch production
     if loop_mode:
-        print("🏭 Batch Production Mode Enabled")
-        print("━" * 60)
-        print(f"📦 Firmware: {name}")
-        print(f"⚡ Baudrate: {baudrate}")
-        if port:
-            print(f"🔗 Port: {port}")
-        else:
-            print("🔗 Port: Auto-detect")
-        print("━" * 60)
-
-        device_count = 0
-
-        while True:
-            device_count += 1
-            print(f"\n🔢 Device #{device_count}")
-
-            # Flash the firmware
-            success = flash_firmware(name, port, baudrate, config)
+        print(
+            "\n".join(
+                [
+                    "🏭 Batch Production Mode Enabled",
+                    "━" * 60,
+                    f"📦 Firmware: {name}",
+                    f"⚡ Baudrate: {baudrate}",
+                    f"🔗 Port: {port or 'Auto-detect'}",
+                    "━" * 60,
+                ]
+            )
+        )
 
-            if success:
-                print(f"✅ Device #{device_count} flashed successfully!")
+        if args["--reuse-port"]:
+            if port:
+                reuse_port(port)
+                print("🔗 Keeping the serial connection open between devices")
             else:
-                print(f"❌ Device #{device_count} failed to flash!")
-                print("💡 Check connection and try again")
+                print("⚠️  --reuse-port needs an explicit --port, ignoring it")
+
+        device_count = 0
 
-            # Wait for user input to continue or stop
-            if not wait_for_user_input():
-                break
+        try:
+            # Set up the terminal once for the whole batch, not per device
+            with cbreak_stdin() as cbreak:
+                while True:
+                    device_count += 1
+                    print(f"\n🔢 Device #{device_count}")
+
+                    # Flash the firmware; local projects are only built once
+                    success = flash_firmware(
+                        name, port, baudrate, config, reuse_build=True
+                    )
+
+                    if success:
+                        print(f"✅ Device #{device_count} flashed successfully!")
+                    else:
+                        print(f"❌ Device #{device_count} failed to flash!")
+                        print("💡 Check connection and try again")
+
+                    # Wait for user input to continue or stop
+                    if not wait_for_user_input(cbreak):
+                        break
+        finally:
+            close_reused_port()
 
         print(f"\n📊 Batch production completed: {device_count} device(s) processed")
 
@@ -2,17 +2,180 @@
 Configuration management for firmware flashing.
 """
 
+import importlib.util
+import json
+import os
 import sys
+import warnings
 from pathlib import Path
 
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader
+
+    warnings.warn(
+        "PyYAML was built without libyaml; falling back to the slower pure-Python "
+        "loader. Install libyaml-dev before installing pyyaml to enable it.",
+        stacklevel=2,
+    )
+
+# (mtime_ns, size, parsed config) of the last load, keyed by absolute path.
+# Only the current version of each file is kept.
+_CONFIG_CACHE: dict[str, tuple[int, int, dict]] = {}
+
+
+def _json_cache_path(sources_file: str) -> Path:
+    """Get the path of the JSON cache stored next to a sources file."""
+    path = Path(sources_file)
+    return path.with_name(f".{path.name}.json")
+
+
+def _read_json_cache(cache_path: Path, source_stat: tuple[int, int]) -> dict | None:
+    """Read the JSON cache if it was written for this version of the YAML file.
+
+    source_stat is the YAML file's (mtime_ns, size). It must match exactly:
+    a backup restored with its old mtime is older than the cache, but the
+    cache was not made from it.
+    """
+    try:
+        cache = json.loads(cache_path.read_bytes())
+        if cache.get("source_stat") != list(source_stat):
+            return None
+        return cache["config"]
+    except (OSError, ValueError, AttributeError, KeyError):
+        # Missing, broken or old format cache
+        return None
+
+
+def _write_json_cache(
+    cache_path: Path, config: dict, source_stat: tuple[int, int]
+) -> None:
+    """Write the JSON cache atomically, ignoring unwritable locations."""
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        cache = {"source_stat": list(source_stat), "config": config}
+        tmp_path.write_text(json.dumps(cache), encoding="utf-8")
+        os.replace(tmp_path, cache_path)
+    except (OSError, TypeError, ValueError):
+        # Read-only mounts or values JSON can't represent: just skip the cache
+        tmp_path.unlink(missing_ok=True)
+
+
+# First line of a compiled sources module, followed by "<mtime_ns> <size>"
+_SOURCE_STAT_HEADER = "# source-stat: "
+
+
+def compiled_sources_path(sources_file: str) -> Path:
+    """Get the path of the compiled Python module for a sources file."""
+    path = Path(sources_file)
+    return path.with_name(f"{path.stem}_compiled.py")
+
+
+def compile_sources_config(sources_file: str) -> Path:
+    """Write a sources file as a Python module defining a SOURCES dict.
+
+    The module's first line records the sources file's mtime and size, and
+    load_sources_config only prefers it over the YAML file while both still
+    match, so the config is loaded from cached bytecode.
+    """
+    with open(sources_file, "rb") as f:
+        # Stat the open file, so the recorded version is the one parsed
+        st = os.fstat(f.fileno())
+        config = yaml.load(f.read(), Loader=SafeLoader)
+
+    output_path = compiled_sources_path(sources_file)
+    output_path.write_text(
+        # mtime_ns and size of the sources file this module was generated from
+        f"{_SOURCE_STAT_HEADER}{st.st_mtime_ns} {st.st_size}\n"
+        f'"""Generated from {Path(sources_file).name} by compile_sources.py."""\n'
+        "\n"
+        "import datetime  # noqa: F401  (YAML dates are written as datetime.date)\n"
+        "\n"
+        f"SOURCES = {config!r}\n",
+        encoding="utf-8",
+    )
+    return output_path
+
+
+def _load_compiled_sources(
+    compiled_path: Path, source_stat: tuple[int, int]
+) -> dict | None:
+    """Import SOURCES from a compiled sources module if it is up to date.
+
+    The module must have been generated from the sources file version with
+    this (mtime_ns, size); being newer than it is not enough. This is read
+    from its first line, so a stale module is never executed.
+    """
+    try:
+        with open(compiled_path, "rb") as f:
+            header = f.readline().decode("ascii")
+        if not header.startswith(_SOURCE_STAT_HEADER):
+            return None
+        mtime_ns, size = header[len(_SOURCE_STAT_HEADER) :].split()
+        if (int(mtime_ns), int(size)) != source_stat:
+            return None
+
+        spec = importlib.util.spec_from_file_location(
+            f"_{compiled_path.stem}", compiled_path
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module.SOURCES
+    except Exception:
+        # Missing or broken module: fall back to the YAML file
+        return None
+
+
+def _index_sources(config: dict) -> dict[str, dict]:
+    """Build the name -> source index stored under ``_by_name``."""
+    by_name: dict[str, dict] = {}
+    for source in config.get("sources", []):
+        name = source.get("name")
+        if name is None:
+            continue
+        if name in by_name:
+            print(f"⚠️  Duplicate firmware name '{name}' in sources, using the first")
+            continue
+        by_name[name] = source
+    config["_by_name"] = by_name
+    return by_name
+
 
 def load_sources_config(sources_file: str) -> dict:
-    """Load and parse the sources configuration file."""
+    """Load and parse the sources configuration file.
+
+    Parsed results are cached in memory until the file's mtime or size
+    changes, and on disk as JSON next to the YAML file so that fresh
+    processes can skip YAML parsing as well. An up-to-date module written by
+    compile_sources_config() takes precedence over both.
+    """
     try:
-        with open(sources_file, encoding="utf-8") as f:
-            return yaml.safe_load(f)
+        st = os.stat(sources_file)
+        source_stat = (st.st_mtime_ns, st.st_size)
+        path = os.path.abspath(sources_file)
+        cached = _CONFIG_CACHE.get(path)
+        if cached is not None and cached[:2] == source_stat:
+            return cached[2]
+
+        config = _load_compiled_sources(
+            compiled_sources_path(sources_file), source_stat
+        )
+        cache_path = _json_cache_path(sources_file)
+        if config is None:
+            config = _read_json_cache(cache_path, source_stat)
+        if config is None:
+            # LibYAML decodes the bytes itself, skip the TextIOWrapper
+            with open(sources_file, "rb") as f:
+                config = yaml.load(f.read(), Loader=SafeLoader)
+            _write_json_cache(cache_path, config, source_stat)
+
+        if isinstance(config, dict):
+            _index_sources(config)
+        _CONFIG_CACHE[path] = (*source_stat, config)
+        return config
     except FileNotFoundError:
         print(f"❌ Sources file not found: {sources_file}")
         sys.exit(1)
@@ -23,10 +186,10 @@ def load_sources_config(sources_file: str) -> dict:
 
 def find_firmware_config(config: dict, name: str) -> dict | None:
     """Find firmware configuration by name."""
-    for source in config.get("sources", []):
-        if source.get("name") == name:
-            return source
-    return None
+    by_name = config.get("_by_name")
+    if by_name is None:
+        by_name = _index_sources(config)
+    return by_name.get(name)
 
 
 def get_firmware_path(config: dict, name: str) -> Path:
@@ -37,27 +200,36 @@ def get_firmware_path(config: dict, name: str) -> Path:
 
 def list_available_firmware(config: dict) -> None:
     """List all available firmware names from the configuration."""
-    print("📋 Available firmware:")
-    print("━" * 50)
+    lines = ["📋 Available firmware:", "━" * 50]
 
     fetchdir = config.get("fetchdir", "./tmpfw")
 
+    # Read the firmware directory once instead of stat'ing every binary
+    try:
+        with os.scandir(fetchdir) as it:
+            existing = {entry.name for entry in it}
+    except FileNotFoundError:
+        existing = set()
+
     for source in config.get("sources", []):
         name = source.get("name", "unknown")
         source_type = source.get("type", "unknown")
         platform = source.get("platform", "unknown")
 
         # Check if firmware file exists
-        firmware_path = Path(fetchdir) / f"{name}.bin"
-        status = "✅" if firmware_path.exists() else "❌"
+        status = "✅" if f"{name}.bin" in existing else "❌"
 
-        print(f"{status} {name} ({source_type}, {platform})")
+        lines.append(f"{status} {name} ({source_type}, {platform})")
         if source_type == "github":
             repo = source.get("repo", "unknown")
             version = source.get("current_version", "latest")
-            print(f"    📦 {repo} - {version}")
+            lines.append(f"    📦 {repo} - {version}")
         elif source_type == "local":
             path = source.get("path", "unknown")
-            print(f"    📁 {path}")
+            lines.append(f"    📁 {path}")
 
-    print("\n💡 Use 'uv run scripts/update_firmwares.py' to download missing firmware")
+    lines.append(
+        "\n💡 Use 'uv run scripts/update_firmwares.py' to download missing firmware"
+    )
+    # Build the whole listing first and write it out at once
+    print("\n".join(lines))
@@ -0,0 +1,237 @@
+"""
+esptool invocation helpers.
+
+esptool is called in-process through its Python API, which saves a full
+interpreter start and esptool import per call. The old behaviour of
+spawning ``python -m esptool`` can be restored with ``use_subprocess(True)``
+(e.g. for debugging esptool itself).
+
+For batch production on a fixed programming jig, ``reuse_port(port)`` keeps
+the serial connection open between write-flash runs: the next board is only
+re-synced instead of going through port opening and chip detection again.
+
+``run_esptool_captured(args, write)`` runs esptool the same way but hands its
+output to a callback instead of the console, e.g. to stream it to a web UI.
+
+esptool keeps module-global state (its logger, the kept connection), so only
+one in-process run happens at a time. A captured run started while another
+one is active uses a subprocess instead of waiting for it.
+"""
+
+import subprocess
+import sys
+import threading
+from collections.abc import Callable
+from pathlib import Path
+
+# Command prefixes shown to the user for in-process and subprocess runs
+_ESPTOOL_DISPLAY = ("esptool",)
+_ESPTOOL_SUBPROCESS_DISPLAY = ("python", "-m", "esptool")
+
+_use_subprocess = False
+# Port whose connection is kept open between write-flash runs, if any
+_reuse_port: str | None = None
+# Open ESPLoader for _reuse_port, created by the first write-flash
+_reused_esp = None
+# esptool module, imported on first use: it dominates CLI startup time
+# (--list/--help never need it). False if it is not installed.
+_esptool = None
+# Held while esptool runs in-process
+_esptool_lock = threading.Lock()
+
+
+def _import_esptool():
+    """Import esptool once, returning None if it is not installed."""
+    global _esptool
+    if _esptool is None:
+        try:
+            import esptool
+        except ImportError:
+            esptool = False
+        _esptool = esptool
+    return _esptool or None
+
+
+def preload_esptool() -> None:
+    """Import esptool ahead of its first use, e.g. while a server starts up."""
+    if not _use_subprocess:
+        _import_esptool()
+
+
+def use_subprocess(enabled: bool) -> None:
+    """Select whether esptool runs as a subprocess instead of in-process."""
+    global _use_subprocess
+    _use_subprocess = enabled
+
+
+def reuse_port(port: str | None) -> None:
+    """Keep the connection to port open between write-flash runs.
+
+    Only safe if every board is the same chip type on the same serial port.
+    Pass None to disable reuse and close a kept connection.
+    """
+    global _reuse_port
+    if port != _reuse_port:
+        close_reused_port()
+    _reuse_port = port
+
+
+def close_reused_port() -> None:
+    """Close the connection kept open by reuse_port, if any."""
+    global _reused_esp
+    if _reused_esp is not None:
+        try:
+            _reused_esp._port.close()
+        except Exception:
+            pass
+        _reused_esp = None
+
+
+def _connect_reused_port(esptool):
+    """Re-sync the kept connection, or open it if missing or broken."""
+    global _reused_esp
+    esp = _reused_esp
+    if esp is not None:
+        try:
+            # A previous run switched to the flashing baud rate via the stub
+            esp._set_port_baudrate(esp.ESP_ROM_BAUD)
+            esp.connect()
+            return esp
+        except Exception:
+            # Port went away (e.g. adapter unplugged): open it again
+            close_reused_port()
+
+    _reused_esp = esptool.cmds.detect_chip(_reuse_port)
+    return _reused_esp
+
+
+class _ThreadOutput:
+    """sys.stdout/sys.stderr replacement that can be redirected per thread.
+
+    contextlib.redirect_stdout swaps the stream for the whole process, which
+    would mix output of concurrent esptool runs and unrelated prints. This
+    proxy only diverts writes made from a thread that registered a callback.
+    """
+
+    def __init__(self, stream, local: threading.local):
+        self._stream = stream
+        self._local = local
+
+    def write(self, text: str) -> int:
+        capture = getattr(self._local, "write", None)
+        if capture is None:
+            return self._stream.write(text)
+        capture(text)
+        return len(text)
+
+    def flush(self) -> None:
+        if getattr(self._local, "write", None) is None:
+            self._stream.flush()
+
+    def isatty(self) -> bool:
+        # Captured output is no terminal: keeps esptool from using cursor tricks
+        if getattr(self._local, "write", None) is not None:
+            return False
+        return self._stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+# Thread-local capture callbacks used by the _ThreadOutput proxies
+_capture = threading.local()
+_capture_lock = threading.Lock()
+
+
+def _install_output_proxies() -> None:
+    """Replace sys.stdout/sys.stderr with _ThreadOutput proxies once."""
+    with _capture_lock:
+        if not isinstance(sys.stdout, _ThreadOutput):
+            sys.stdout = _ThreadOutput(sys.stdout, _capture)
+        if not isinstance(sys.stderr, _ThreadOutput):
+            sys.stderr = _ThreadOutput(sys.stderr, _capture)
+
+
+def run_esptool_captured(args: list[str], write: Callable[[str], None]) -> int:
+    """Run esptool like run_esptool, passing its output to write.
+
+    Blocks until esptool is done, so async code should call it through
+    asyncio.to_thread. write is called from that thread.
+
+    Returns:
+        The esptool exit code (0 on success)
+    """
+    esptool = None if _use_subprocess else _import_esptool()
+    if esptool is None or not _esptool_lock.acquire(blocking=False):
+        # Subprocess mode, or another run is using the in-process esptool
+        with subprocess.Popen(
+            [sys.executable, "-m", "esptool", *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        ) as process:
+            while chunk := process.stdout.read1(64 * 1024):
+                write(chunk.decode("utf-8", errors="replace"))
+        return process.returncode
+
+    try:
+        _install_output_proxies()
+        _capture.write = write
+        try:
+            return _run_esptool_in_process(esptool, args)
+        finally:
+            _capture.write = None
+    finally:
+        _esptool_lock.release()
+
+
+def format_esptool_command(args: list[str]) -> str:
+    """Format esptool arguments as a shell-like command for display."""
+    if _use_subprocess or _import_esptool() is None:
+        return " ".join((*_ESPTOOL_SUBPROCESS_DISPLAY, *args))
+    return " ".join((*_ESPTOOL_DISPLAY, *args))
+
+
+def write_flash_args(image: Path, port: str | None, baudrate: int) -> list[str]:
+    """Build esptool arguments to write a factory image at offset 0x0."""
+    return [
+        "--baud",
+        str(baudrate),
+        *(("--port", port) if port else ()),
+        "write-flash",
+        "0x0",  # Flash address for factory firmware
+        str(image),
+    ]
+
+
+def run_esptool(args: list[str]) -> int:
+    """Run esptool with the given command line arguments.
+
+    Args:
+        args: esptool arguments, e.g. ["--baud", "921600", "write-flash", ...]
+
+    Returns:
+        The esptool exit code (0 on success)
+    """
+    esptool = None if _use_subprocess else _import_esptool()
+    if esptool is None:
+        return subprocess.run([sys.executable, "-m", "esptool", *args]).returncode
+
+    with _esptool_lock:
+        return _run_esptool_in_process(esptool, args)
+
+
+def _run_esptool_in_process(esptool, args: list[str]) -> int:
+    """Run esptool through its Python API; _esptool_lock must be held."""
+    try:
+        esp = None
+        if _reuse_port and "write-flash" in args:
+            esp = _connect_reused_port(esptool)
+        esptool.main(args, esp=esp)
+    except SystemExit as e:
+        # esptool exits with sys.exit() on argument and connection errors
+        return e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        # esptool.FatalError, or serial.SerialException if the port can't open
+        print(f"\nA fatal error occurred: {e}")
+        return 2
+    return 0
@@ -2,48 +2,81 @@
 Factory image creation and flashing utilities.
 """
 
+import os
 import subprocess
+import sys
+import tempfile
 from pathlib import Path
 
+from .esptool_runner import format_esptool_command, run_esptool, write_flash_args
+
+# Build output is kept in memory up to this size, then spilled to disk
+_LOG_SPOOL_SIZE = 64 * 1024
+# Amount of build output shown when a command fails
+_LOG_TAIL_SIZE = 4 * 1024
+
+
+def _run_logged(cmd: list[str], cwd: Path) -> int:
+    """Run a command and only show the tail of its output if it fails.
+
+    Output is streamed into a spooled temporary file instead of being
+    captured and decoded in full.
+
+    Returns:
+        The exit code of the command
+    """
+    with tempfile.SpooledTemporaryFile(max_size=_LOG_SPOOL_SIZE) as log:
+        with subprocess.Popen(
+            cmd, cwd=str(cwd), stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        ) as process:
+            while chunk := process.stdout.read(_LOG_SPOOL_SIZE):
+                log.write(chunk)
+
+        if process.returncode != 0:
+            log.seek(max(0, log.tell() - _LOG_TAIL_SIZE))
+            sys.stderr.write(log.read().decode("utf-8", errors="replace"))
+            sys.stderr.flush()
+        return process.returncode
+
 
 def create_factory_image(name: str, project_dir: Path) -> Path | None:
     """Create a factory image using PlatformIO."""
     print("🔧 Building factory image...")
 
     # First build the project to ensure all binaries exist
-    try:
-        subprocess.run(
-            ["pio", "run"],
-            cwd=str(project_dir),
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Build failed: {e}")
+    returncode = _run_logged(["pio", "run"], project_dir)
+    if returncode != 0:
+        print(f"❌ Build failed with exit code {returncode}")
         return None
 
     # Find the build directory and binaries
     build_dir = project_dir / ".pio" / "build"
-    if not build_dir.exists():
+
+    # Look for environment directories (usually esp32dev, esp32, etc.)
+    # DirEntry type checks come from the directory read, no extra stat needed
+    try:
+        with os.scandir(build_dir) as it:
+            env_name = next((e.name for e in it if e.is_dir()), None)
+    except FileNotFoundError:
         print("❌ Build directory not found")
         return None
 
-    # Look for environment directories (usually esp32dev, esp32, etc.)
-    env_dirs = [d for d in build_dir.iterdir() if d.is_dir()]
-    if not env_dirs:
+    if env_name is None:
         print("❌ No build environment found")
         return None
 
-    env_dir = env_dirs[0]  # Take the first environment
-    print(f"📂 Using build environment: {env_dir.name}")
+    env_dir = build_dir / env_name  # Take the first environment
+    print(f"📂 Using build environment: {env_name}")
 
     # Check for required files
+    with os.scandir(env_dir) as it:
+        env_files = {e.name for e in it if e.is_file()}
+
     bootloader_bin = env_dir / "bootloader.bin"
     partitions_bin = env_dir / "partitions.bin"
     firmware_bin = env_dir / "firmware.bin"
 
-    if not all(f.exists() for f in [bootloader_bin, partitions_bin, firmware_bin]):
+    if not {"bootloader.bin", "partitions.bin", "firmware.bin"} <= env_files:
         print("❌ Required binary files not found")
         return None
 
@@ -53,21 +86,13 @@ def create_factory_image(name: str, project_dir: Path) -> Path | None:
     try:
         boot_app0_path = env_dir / "boot_app0.bin"
 
-        # Use relative paths within project directory for cleaner commands
-        rel_bootloader = Path(".pio/build") / env_dir.name / "bootloader.bin"
-        rel_partitions = Path(".pio/build") / env_dir.name / "partitions.bin"
-        rel_firmware = Path(".pio/build") / env_dir.name / "firmware.bin"
-        rel_factory = Path(f"{name}-factory.bin")
-
-        cmd = [
-            "python",
-            "-m",
-            "esptool",
+        # Absolute paths, since esptool runs in-process without changing cwd
+        args = [
             "--chip",
             "esp32",
             "merge-bin",
             "-o",
-            str(rel_factory),
+            str(factory_image.resolve()),
             "--flash-mode",
             "dio",
             "--flash-freq",
@@ -75,26 +100,24 @@ def create_factory_image(name: str, project_dir: Path) -> Path | None:
             "--flash-size",
             "4MB",
             "0x1000",
-            str(rel_bootloader),
+            str(bootloader_bin.resolve()),
             "0x8000",
-            str(rel_partitions),
+            str(partitions_bin.resolve()),
         ]
 
         # Add boot_app0.bin only if it exists
-        if boot_app0_path.exists():
-            rel_boot_app0 = Path(".pio/build") / env_dir.name / "boot_app0.bin"
-            cmd.extend(["0xe000", str(rel_boot_app0)])
+        if "boot_app0.bin" in env_files:
+            args.extend(["0xe000", str(boot_app0_path.resolve())])
 
         # Add firmware at the end
-        cmd.extend(["0x10000", str(rel_firmware)])
+        args.extend(["0x10000", str(firmware_bin.resolve())])
 
-        print(f"🔧 Command: {' '.join(cmd)}")
-        print(f"📂 Working directory: {project_dir}")
+        print(f"🔧 Command: {format_esptool_command(args)}")
 
-        # Run esptool from the project directory to fix path issues
-        subprocess.run(
-            cmd, cwd=str(project_dir), check=True, capture_output=True, text=True
-        )
+        returncode = run_esptool(args)
+        if returncode != 0:
+            print(f"❌ Factory image creation failed with exit code {returncode}")
+            return None
 
         if factory_image.exists():
             size_kb = factory_image.stat().st_size / 1024
@@ -104,9 +127,6 @@ def create_factory_image(name: str, project_dir: Path) -> Path | None:
             print("❌ Factory image creation failed - file not created")
             return None
 
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Factory image creation failed: {e}")
-        return None
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
         return None
@@ -116,33 +136,18 @@ def flash_factory_image(factory_image: Path, port: str | None, baudrate: int) ->
     """Flash the factory image using esptool."""
     print("⬇️  Flashing factory image...")
 
-    # Build esptool command
-    cmd = ["python", "-m", "esptool", "--baud", str(baudrate)]
-
-    # Add port if specified
-    if port:
-        cmd.extend(["--port", port])
-
-    # Add flash command and parameters
-    cmd.extend(
-        [
-            "write-flash",
-            "0x0",  # Flash address for factory firmware
-            str(factory_image),
-        ]
-    )
-
-    print(f"🔧 Command: {' '.join(cmd)}")
+    args = write_flash_args(factory_image, port, baudrate)
+    print(f"🔧 Command: {format_esptool_command(args)}")
     print()
 
     try:
-        subprocess.run(cmd, check=True)
+        returncode = run_esptool(args)
+        if returncode != 0:
+            print(f"\n❌ Flashing failed with exit code {returncode}")
+            return False
         print("\n✅ Factory image flashed successfully!")
         return True
 
-    except subprocess.CalledProcessError as e:
-        print(f"\n❌ Flashing failed with exit code {e.returncode}")
-        return False
     except Exception as e:
         print(f"❌ Error during flashing: {e}")
         return False
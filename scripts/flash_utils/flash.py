@@ -2,20 +2,30 @@
 Main flash functionality.
 """
 
-import subprocess
 from pathlib import Path
 
-from .config import find_firmware_config, get_firmware_path, load_sources_config
+from .config import find_firmware_config, get_firmware_path
+from .esptool_runner import format_esptool_command, run_esptool, write_flash_args
 from .factory import create_factory_image, flash_factory_image
 from .platformio import flash_via_platformio
 
+# Factory images built from local projects during this run, by project dir
+_built_images: dict[Path, Path] = {}
+
 
 def flash_local_project(
-    name: str, port: str | None, baudrate: int, firmware_config: dict
+    name: str,
+    port: str | None,
+    baudrate: int,
+    config: dict,
+    firmware_config: dict,
+    reuse_build: bool = False,
 ) -> bool:
     """Flash firmware using PlatformIO.
 
-    Prefer downloaded factory image over rebuild.
+    Prefer downloaded factory image over rebuild. With reuse_build, a factory
+    image built earlier in this process is flashed again instead of rebuilding
+    the project for every device (batch production).
     """
     project_path = firmware_config.get("path", "")
     if not project_path:
@@ -27,33 +37,44 @@ def flash_local_project(
         print(f"❌ Project directory not found: {project_dir}")
         return False
 
-    print("🚀 PlatformIO Local Project")
-    print("━" * 50)
-    print(f"📦 Project: {name}")
-    print(f"📁 Path: {project_dir}")
-    if port:
-        print(f"🔗 Port: {port}")
-    else:
-        print("🔗 Port: Auto-detect")
-    print(f"⚡ Baudrate: {baudrate}")
-    print()
+    # Emit the banner with a single write
+    print(
+        "\n".join(
+            [
+                "🚀 PlatformIO Local Project",
+                "━" * 50,
+                f"📦 Project: {name}",
+                f"📁 Path: {project_dir}",
+                f"🔗 Port: {port or 'Auto-detect'}",
+                f"⚡ Baudrate: {baudrate}",
+                "",
+            ]
+        )
+    )
 
     # First check if we have a downloaded factory image from update_firmwares.py
-    config = load_sources_config("sources.yaml")  # Get config to find fetchdir
-    fetchdir = config.get("fetchdir", "./tmpfw")
-    downloaded_firmware = Path(fetchdir) / f"{name}.bin"
+    downloaded_firmware = get_firmware_path(config, name)
+    try:
+        size_kb = downloaded_firmware.stat().st_size / 1024
+    except FileNotFoundError:
+        size_kb = None
 
-    if downloaded_firmware.exists():
+    if size_kb is not None:
         print(f"📦 Using downloaded factory image: {downloaded_firmware}")
-        size_kb = downloaded_firmware.stat().st_size / 1024
         print(f"📊 Size: {size_kb:.1f} KB")
         return flash_factory_image(downloaded_firmware, port, baudrate)
 
+    factory_image_path = _built_images.get(project_dir) if reuse_build else None
+    if factory_image_path and factory_image_path.exists():
+        print(f"📦 Reusing factory image from this batch: {factory_image_path}")
+        return flash_factory_image(factory_image_path, port, baudrate)
+
     # If no downloaded image, create one from source
     print("📥 No downloaded factory image found, creating from source...")
     factory_image_path = create_factory_image(name, project_dir)
     if factory_image_path and factory_image_path.exists():
         print(f"📦 Created factory image: {factory_image_path}")
+        _built_images[project_dir] = factory_image_path
         return flash_factory_image(factory_image_path, port, baudrate)
     else:
         print("⚠️  Factory image creation failed, using direct PlatformIO upload")
@@ -71,57 +92,47 @@ def flash_binary_file(
         print("💡 Use 'uv run scripts/update_firmwares.py' to download firmware")
         return False
 
-    print("🚀 ESP32 Firmware Flasher")
-    print("━" * 50)
-    print(f"📦 Firmware: {name}")
-    print(f"📁 File: {firmware_path}")
-    print("🔌 Chip: Auto-detect")
-    if port:
-        print(f"🔗 Port: {port}")
-    else:
-        print("🔗 Port: Auto-detect")
-    print(f"⚡ Baudrate: {baudrate}")
-    print()
-
-    # Build esptool command
-    cmd = ["python", "-m", "esptool", "--baud", str(baudrate)]
-
-    # Add port if specified
-    if port:
-        cmd.extend(["--port", port])
-
-    # Add flash command and parameters
-    cmd.extend(
-        [
-            "write-flash",  # Updated to use hyphen instead of underscore
-            "0x0",  # Flash address for factory firmware
-            str(firmware_path),
-        ]
+    # Emit the banner with a single write
+    print(
+        "\n".join(
+            [
+                "🚀 ESP32 Firmware Flasher",
+                "━" * 50,
+                f"📦 Firmware: {name}",
+                f"📁 File: {firmware_path}",
+                "🔌 Chip: Auto-detect",
+                f"🔗 Port: {port or 'Auto-detect'}",
+                f"⚡ Baudrate: {baudrate}",
+                "",
+            ]
+        )
     )
 
-    print(f"🔧 Command: {' '.join(cmd)}")
+    args = write_flash_args(firmware_path, port, baudrate)
+    print(f"🔧 Command: {format_esptool_command(args)}")
     print()
 
     try:
         # Run esptool
-        subprocess.run(cmd, check=True)
+        returncode = run_esptool(args)
+        if returncode != 0:
+            print(f"\n❌ Flashing failed with exit code {returncode}")
+            return False
         print("\n✅ Firmware flashed successfully!")
         return True
 
-    except subprocess.CalledProcessError as e:
-        print(f"\n❌ Flashing failed with exit code {e.returncode}")
-        return False
-    except FileNotFoundError:
-        print("❌ esptool not found. Install it with:")
-        print("   pip install esptool")
-        return False
     except Exception as e:
         print(f"❌ Error during flashing: {e}")
         return False
 
 
-def flash_firmware(name: str, port: str | None, baudrate: int, config: dict) -> bool:
-    """Flash firmware to ESP32 device using esptool or PlatformIO."""
+def flash_firmware(
+    name: str, port: str | None, baudrate: int, config: dict, reuse_build: bool = False
+) -> bool:
+    """Flash firmware to ESP32 device using esptool or PlatformIO.
+
+    reuse_build is passed on to flash_local_project for local sources.
+    """
 
     # Find firmware configuration
     firmware_config = find_firmware_config(config, name)
@@ -134,6 +145,8 @@ def flash_firmware(name: str, port: str | None, baudrate: int, config: dict) ->
 
     # Handle local PlatformIO projects differently
     if source_type == "local":
-        return flash_local_project(name, port, baudrate, firmware_config)
+        return flash_local_project(
+            name, port, baudrate, config, firmware_config, reuse_build
+        )
     else:
         return flash_binary_file(name, port, baudrate, config, firmware_config)
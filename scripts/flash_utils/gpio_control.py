@@ -8,8 +8,33 @@ the firmware flashing process.
 On systems without GPIO support, all operations are silently ignored.
 """
 
+import sys
 import time
 
+# Result of the RPi.GPIO import: (available, module), None until first tried
+_RPI_GPIO: tuple[bool, object | None] | None = None
+
+
+def _import_rpi_gpio() -> tuple[bool, object | None]:
+    """Import RPi.GPIO once and cache the outcome, including failure."""
+    global _RPI_GPIO
+    if _RPI_GPIO is None:
+        gpio = sys.modules.get("RPi.GPIO")
+        if gpio is None:
+            try:
+                import RPi.GPIO as gpio
+            except ImportError:
+                gpio = None
+        _RPI_GPIO = (gpio is not None, gpio)
+    return _RPI_GPIO
+
+
+def _sleep_until(deadline: float) -> None:
+    """Sleep until the given time.monotonic() deadline unless it has passed."""
+    remaining = deadline - time.monotonic()
+    if remaining > 0:
+        time.sleep(remaining)
+
 
 class GPIOController:
     """GPIO controller for hardware management during flashing."""
@@ -21,15 +46,11 @@ class GPIOController:
 
     def _init_gpio(self):
         """Initialize GPIO library if available."""
-        try:
-            import RPi.GPIO as GPIO
-
-            self.gpio = GPIO
-            self.gpio_available = True
+        self.gpio_available, self.gpio = _import_rpi_gpio()
+        if self.gpio_available:
             print("🔌 GPIO support detected (Raspberry Pi)")
-        except ImportError:
+        else:
             print("ℹ️  GPIO support not available (running on non-Raspberry Pi system)")
-            self.gpio_available = False
 
     def setup_pin(self, pin: int, mode: str = "OUT") -> bool:
         """Setup GPIO pin for use.
@@ -163,6 +184,9 @@ class FlashGPIOControl:
         2. Reset device (if reset pin configured)
         3. Release boot pin after reset
 
+        Settle times are tracked as monotonic deadlines, so time spent between
+        the steps counts towards them instead of being added on top.
+
         Returns:
             True if GPIO operations were attempted, False if no GPIO config
         """
@@ -178,30 +202,38 @@ class FlashGPIOControl:
         print("🔌 Entering flash mode via GPIO...")
 
         try:
+            ready_at = time.monotonic()
+
             # Step 1: Assert boot pin if configured
             if boot_pin:
                 boot_active_low = self.config.get("boot_active_low", True)
                 boot_state = not boot_active_low  # Assert boot
                 if self.controller.set_pin(boot_pin, boot_state):
                     print(f"🔌 Boot pin {boot_pin} asserted")
-                time.sleep(0.1)  # Give time for boot pin to stabilize
+                # Give time for boot pin to stabilize
+                ready_at = time.monotonic() + 0.1
 
             # Step 2: Reset device if reset pin configured
             if reset_pin:
+                _sleep_until(ready_at)
                 reset_duration = self.config.get("reset_duration", 0.1)
                 reset_active_low = self.config.get("reset_active_low", True)
                 if self.controller.pulse_pin(
                     reset_pin, reset_duration, reset_active_low
                 ):
                     print(f"🔌 Reset pulse sent on pin {reset_pin}")
-                time.sleep(0.2)  # Give time for reset to complete
+                # Give time for reset to complete
+                ready_at = time.monotonic() + 0.2
 
             # Step 3: Release boot pin after reset
             if boot_pin:
+                _sleep_until(ready_at)
                 boot_release_state = boot_active_low  # Release boot
                 if self.controller.set_pin(boot_pin, boot_release_state):
                     print(f"🔌 Boot pin {boot_pin} released")
-                time.sleep(0.1)
+                ready_at = time.monotonic() + 0.1
+
+            _sleep_until(ready_at)
 
             print("✅ Flash mode entry sequence completed")
             return True
@@ -1,4 +1,15 @@
 // ESP32 Firmware Flash Tool - JavaScript
+
+// Terminal messages arrive as UTF-8 JSON in binary WebSocket frames
+const messageDecoder = new TextDecoder();
+
+function parseWebSocketMessage(event) {
+    const text = typeof event.data === 'string'
+        ? event.data
+        : messageDecoder.decode(event.data);
+    return JSON.parse(text);
+}
+
 async function loadFirmware() {
     const loading = document.getElementById('loading');
     const error = document.getElementById('error');
@@ -186,7 +197,7 @@ async function flashFirmware(name) {
     // Set up button state handling
     // We'll listen for WebSocket messages to determine success/failure
     const handleFlashResult = (event) => {
-        const data = JSON.parse(event.data);
+        const data = parseWebSocketMessage(event);
 
         if (data.message && data.message.includes(name)) {
             if (data.type === 'success') {
@@ -309,13 +320,14 @@ class Terminal {
         const wsUrl = `${protocol}//${window.location.host}/ws/terminal`;
 
         this.websocket = new WebSocket(wsUrl);
+        this.websocket.binaryType = 'arraybuffer';
 
         this.websocket.onopen = () => {
             this.addLine('🚀 WebSocket Terminal connected', 'success', false);
         };
 
         this.websocket.onmessage = (event) => {
-            const data = JSON.parse(event.data);
+            const data = parseWebSocketMessage(event);
             this.handleWebSocketMessage(data);
         };
 
@@ -351,10 +363,6 @@ class Terminal {
                 // Progress messages should overwrite previous progress only
                 this.updateOrAddLine(message, 'progress', false);
                 break;
-            case 'partial':
-                // Partial messages should also overwrite previous progress/partial
-                this.updateOrAddLine(message, 'partial', false);
-                break;
             case 'success':
                 // Success messages are always new lines
                 this.addLine(message, 'success', false);
@@ -366,8 +374,21 @@ class Terminal {
                 this.addLine(message, 'warning', false);
                 break;
             case 'monitor':
-                // Monitor messages are shown as output with special styling
-                this.addLine(message, 'monitor', false);
+                // Monitor messages are shown as output with special styling,
+                // bursts of serial output arrive batched in data.lines
+                if (data.lines) {
+                    for (const line of data.lines) {
+                        this.addLine(line, 'monitor', false);
+                    }
+                } else {
+                    this.addLine(message, 'monitor', false);
+                }
+                break;
+            case 'batch':
+                // Several messages sent in one frame, handled in order
+                for (const item of data.items) {
+                    this.handleWebSocketMessage({ ...item, timestamp });
+                }
                 break;
             case 'pong':
                 // Handle ping/pong silently
@@ -471,21 +492,13 @@ class Terminal {
     }
 
     updateOrAddLine(text, type = 'progress', showPrompt = false) {
-        // Simple logic: only overwrite if last line was progress/partial AND this is also progress/partial
+        // Simple logic: only overwrite if last line was progress AND this is also progress
         const lines = this.output.getElementsByClassName('terminal-line');
         if (lines.length > 0) {
             const lastLine = lines[lines.length - 1];
 
-            const lastWasProgressOrPartial =
-                lastLine.classList.contains('terminal-progress') ||
-                lastLine.classList.contains('terminal-partial');
-
-            const thisIsProgressOrPartial =
-                type === 'progress' ||
-                type === 'partial';
-
-            // Only overwrite if both conditions are met
-            if (lastWasProgressOrPartial && thisIsProgressOrPartial) {
+            // Only overwrite if both are progress lines
+            if (type === 'progress' && lastLine.classList.contains('terminal-progress')) {
                 const textSpan = lastLine.querySelector('.terminal-text');
                 if (textSpan) {
                     textSpan.textContent = text;
@@ -7,45 +7,116 @@ Provides a user-friendly web interface for the flash utilities.
 """
 
 import asyncio
+import gzip
+import hashlib
 import json
+import mimetypes
+import os
 import re
+import shlex
+import threading
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 
 import serial
 import serial.tools.list_ports
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from flash_utils import flash_firmware, load_sources_config
+from flash_utils import find_firmware_config, flash_firmware, load_sources_config
+from flash_utils.esptool_runner import (
+    format_esptool_command,
+    preload_esptool,
+    run_esptool_captured,
+    write_flash_args,
+)
 from pydantic import BaseModel
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse
+
+try:
+    import orjson
+except ImportError:  # Optional, the stdlib json module is used instead
+    orjson = None
 
 # Global monitor tasks tracking
 monitor_tasks = {}
 
+SOURCES_FILE = "sources.yaml"
+
+
+def _get_config() -> dict:
+    """Get the sources configuration.
+
+    load_sources_config keeps the parsed file in memory until its mtime
+    changes, so this only costs a stat per request.
+    """
+    return load_sources_config(SOURCES_FILE)
+
+
+# Directory the firmware binaries are downloaded to
+_TMPFW = Path("tmpfw")
 
-async def cleanup_finished_tasks():
-    """Clean up finished monitor tasks from the global dict."""
-    to_remove = []
-    for port, task in monitor_tasks.items():
-        if task.done():
-            to_remove.append(port)
 
-    for port in to_remove:
+def _firmware_path(name: str) -> Path:
+    """Get the path of a downloaded firmware binary."""
+    return _TMPFW / f"{name}.bin"
+
+
+def _forget_monitor_task(port: str, task: asyncio.Task):
+    """Remove a finished monitor task from the global dict."""
+    # A new monitor may already have been started for the port
+    if monitor_tasks.get(port) is task:
         del monitor_tasks[port]
 
 
+def _warm_up():
+    """Import esptool and build the firmware list ahead of the first request."""
+    preload_esptool()
+    # A missing sources file exits in _get_config(), leave that to a request
+    if os.path.exists(SOURCES_FILE):
+        get_firmware_list()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up caches in the background so the first requests don't wait."""
+    app.state.warm_up = asyncio.create_task(asyncio.to_thread(_warm_up))
+    yield
+
+
 app = FastAPI(
     title="ESP32 Firmware Flash Tool",
     description="Web interface for flashing ESP32 firmware",
     version="1.0.0",
+    lifespan=lifespan,
+    # ORJSONResponse needs orjson, which is optional
+    default_response_class=ORJSONResponse if orjson is not None else JSONResponse,
 )
 
 
+# Pattern to match ANSI escape sequences (CSI, including private modes such
+# as the cursor hide/show sequences progress bars emit)
+_ANSI_RE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+# The same for undecoded output
+_ANSI_BYTES_RE = re.compile(_ANSI_RE.pattern.encode())
+
+
 def clean_ansi_sequences(text: str) -> str:
     """Remove ANSI escape sequences from text."""
-    # Pattern to match ANSI escape sequences
-    ansi_pattern = re.compile(r"\x1b\[[0-9;]*[mKABC]")
-    return ansi_pattern.sub("", text)
+    # Most lines carry no escapes at all, skip the regex engine for them
+    if "\x1b" not in text:
+        return text
+    return _ANSI_RE.sub("", text)
 
 
 def determine_message_type(line: str) -> str:
@@ -64,6 +135,84 @@ def determine_message_type(line: str) -> str:
         return "output"
 
 
+if orjson is not None:
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+else:
+
+    def _json_dumps(obj) -> bytes:
+        """Serialize to UTF-8 encoded JSON with the stdlib json module."""
+        return json.dumps(obj).encode()
+
+    _json_loads = json.loads
+
+
+def _json_response(content) -> Response:
+    """Build a JSON response directly, skipping FastAPI's jsonable_encoder."""
+    return Response(_json_dumps(content), media_type="application/json")
+
+
+# Envelope of all terminal WebSocket messages, only the message needs escaping.
+# Messages are sent as UTF-8 JSON in binary frames, which orjson produces
+# directly without a str round trip.
+_MESSAGE_PREFIX = b'{"type":"%s","message":'
+_TIMESTAMP_PREFIX = b',"timestamp":"'
+_LINES_TEMPLATE = b'{"type":"%s","lines":%s,"timestamp":"%s"}'
+_BATCH_TEMPLATE = b'{"type":"batch","items":%s,"timestamp":"%s"}'
+_timestamp_cache = {"ms": None, "iso": b""}
+
+# Prebuilt message prefixes of the types sent by the server
+_MESSAGE_PREFIXES = {
+    msg_type: _MESSAGE_PREFIX % msg_type.encode()
+    for msg_type in (
+        "command",
+        "error",
+        "info",
+        "monitor",
+        "output",
+        "pong",
+        "progress",
+        "success",
+    )
+}
+
+
+def _now_iso() -> bytes:
+    """Get the current time as ISO bytes, formatted once per millisecond."""
+    ms = int(time.time() * 1000)
+    if ms != _timestamp_cache["ms"]:
+        _timestamp_cache["ms"] = ms
+        _timestamp_cache["iso"] = (
+            datetime.fromtimestamp(ms / 1000).isoformat(timespec="milliseconds")
+        ).encode()
+    return _timestamp_cache["iso"]
+
+
+async def send_message(websocket: WebSocket, msg_type: str, message: str):
+    """Send a terminal message with type and timestamp to the WebSocket."""
+    prefix = _MESSAGE_PREFIXES.get(msg_type) or _MESSAGE_PREFIX % msg_type.encode()
+    await websocket.send_bytes(
+        b"".join((prefix, _json_dumps(message), _TIMESTAMP_PREFIX, _now_iso(), b'"}'))
+    )
+
+
+async def send_lines(websocket: WebSocket, msg_type: str, lines: list[str]):
+    """Send several lines of the same type to the WebSocket in one message."""
+    await websocket.send_bytes(
+        _LINES_TEMPLATE % (msg_type.encode(), _json_dumps(lines), _now_iso())
+    )
+
+
+async def send_batch(websocket: WebSocket, messages: list[tuple[str, str]]):
+    """Send several (type, message) terminal messages in one message.
+
+    Code that produces several messages in one go should collect them and
+    send them with this instead of awaiting a send for each one.
+    """
+    items = [{"type": msg_type, "message": message} for msg_type, message in messages]
+    await websocket.send_bytes(_BATCH_TEMPLATE % (_json_dumps(items), _now_iso()))
+
+
 class FlashRequest(BaseModel):
     """Request model for firmware flashing."""
 
@@ -83,14 +232,39 @@ class FlashResponse(BaseModel):
 class FirmwareInfo:
     """Information about firmware for web display."""
 
-    def __init__(self, name: str, source_config: dict):
+    __slots__ = (
+        "name",
+        "type",
+        "platform",
+        "description",
+        "available",
+        "version",
+        "size_kb",
+    )
+
+    def __init__(
+        self, name: str, source_config: dict, binary_sizes: dict | None = None
+    ):
         self.name = name
         self.type = source_config.get("type", "unknown")
         self.platform = source_config.get("platform", "unknown")
         self.description = self._get_description(source_config)
-        self.available = self._check_availability(name)
         self.version = self._get_version(source_config)
-        self.size_kb = self._get_size(name) if self.available else 0
+
+        if binary_sizes is None:
+            binary_sizes = self._stat_binary(name)
+        size = binary_sizes.get(name)
+        self.available = size is not None
+        self.size_kb = round(size / 1024, 1) if self.available else 0
+
+    @staticmethod
+    def _stat_binary(name: str) -> dict[str, int]:
+        """Get {name: size} for a single firmware binary, empty if missing."""
+        # One stat answers both "is it there" and "how big is it"
+        try:
+            return {name: os.stat(_firmware_path(name)).st_size}
+        except FileNotFoundError:
+            return {}
 
     def _get_description(self, config: dict) -> str:
         """Generate a description for the firmware."""
@@ -101,11 +275,6 @@ class FirmwareInfo:
         else:
             return f"Type: {self.type}"
 
-    def _check_availability(self, name: str) -> bool:
-        """Check if firmware binary is available."""
-        firmware_path = Path("tmpfw") / f"{name}.bin"
-        return firmware_path.exists()
-
     def _get_version(self, config: dict) -> str:
         """Get firmware version."""
         if self.type == "github":
@@ -113,13 +282,6 @@ class FirmwareInfo:
         else:
             return "local"
 
-    def _get_size(self, name: str) -> float:
-        """Get firmware size in KB."""
-        firmware_path = Path("tmpfw") / f"{name}.bin"
-        if firmware_path.exists():
-            return firmware_path.stat().st_size / 1024
-        return 0
-
     def to_dict(self) -> dict:
         """Convert to dictionary for JSON serialization."""
         return {
@@ -129,12 +291,25 @@ class FirmwareInfo:
             "description": self.description,
             "available": self.available,
             "version": self.version,
-            "size_kb": round(self.size_kb, 1),
+            "size_kb": self.size_kb,
         }
 
 
+# How long a serial port listing is reused, in seconds
+_PORTS_CACHE_TTL = 1.0
+_ports_cache = {"time": float("-inf"), "ports": []}
+
+
 def get_serial_ports() -> list[dict]:
-    """Get list of available serial ports."""
+    """Get list of available serial ports.
+
+    Enumerating ports walks /sys (or the registry on Windows), so the result
+    is reused for _PORTS_CACHE_TTL seconds when the UI polls repeatedly.
+    """
+    now = time.monotonic()
+    if now - _ports_cache["time"] < _PORTS_CACHE_TTL:
+        return _ports_cache["ports"]
+
     ports = []
 
     # Add auto option
@@ -157,27 +332,109 @@ def get_serial_ports() -> list[dict]:
     except Exception as e:
         print(f"Error listing serial ports: {e}")
 
+    _ports_cache["time"] = now
+    _ports_cache["ports"] = ports
     return ports
 
 
+def get_binary_sizes() -> dict[str, int]:
+    """Get {firmware name: size} for all binaries in tmpfw with one directory read."""
+    sizes = {}
+    try:
+        with os.scandir(_TMPFW) as it:
+            for entry in it:
+                if entry.name.endswith(".bin") and entry.is_file():
+                    sizes[entry.name[:-4]] = entry.stat().st_size
+    except FileNotFoundError:
+        pass
+    return sizes
+
+
+# Last firmware list with the config object and tmpfw mtime it was built for
+_firmware_list_cache = {
+    "config": None,
+    "mtime_ns": None,
+    "firmware": [],
+    # get_firmware_list_json() result, filled on first use
+    "json": None,
+}
+
+
+def _invalidate_firmware_list():
+    """Drop the cached firmware list, e.g. after binaries were replaced."""
+    _firmware_list_cache["config"] = None
+
+
 def get_firmware_list() -> list[dict]:
-    """Get list of available firmware."""
+    """Get list of available firmware as dicts for JSON serialization.
+
+    The list is reused while sources.yaml and the tmpfw directory are
+    unchanged. Rewriting an existing binary in place keeps the directory
+    mtime, so firmware updates run from the web UI drop the cache.
+    """
     try:
-        config = load_sources_config("sources.yaml")
+        config = _get_config()
+        try:
+            mtime_ns = os.stat(_TMPFW).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        cache = _firmware_list_cache
+        if cache["config"] is config and cache["mtime_ns"] == mtime_ns:
+            return cache["firmware"]
+
         firmware_list = []
+        binary_sizes = get_binary_sizes()
 
         for source in config.get("sources", []):
             name = source.get("name")
             if name:
-                firmware_info = FirmwareInfo(name, source)
-                firmware_list.append(firmware_info)
+                firmware_info = FirmwareInfo(name, source, binary_sizes)
+                firmware_list.append(firmware_info.to_dict())
 
+        cache.update(
+            config=config, mtime_ns=mtime_ns, firmware=firmware_list, json=None
+        )
         return firmware_list
     except Exception as e:
         print(f"Error loading firmware list: {e}")
         return []
 
 
+# Firmware list JSON from this size on is also kept gzipped
+_GZIP_MIN_SIZE = 1024
+
+
+def get_firmware_list_json() -> tuple[bytes, bytes | None, str]:
+    """Get the firmware list serialized as JSON.
+
+    Returns:
+        The JSON, its gzipped copy (None for small lists) and its ETag
+    """
+    firmware_list = get_firmware_list()
+    cache = _firmware_list_cache
+    cached = cache["firmware"] is firmware_list
+    if cached and cache["json"] is not None:
+        return cache["json"]
+
+    payload = _json_dumps(firmware_list)
+    payload_gz = None
+    if len(payload) >= _GZIP_MIN_SIZE:
+        payload_gz = gzip.compress(payload, mtime=0)
+    etag = f'"{hashlib.blake2b(payload, digest_size=8).hexdigest()}"'
+    result = payload, payload_gz, etag
+    if cached:
+        cache["json"] = result
+    return result
+
+
+def get_firmware_info(name: str) -> FirmwareInfo | None:
+    """Get information about a single firmware, None if it is not configured."""
+    source = find_firmware_config(_get_config(), name)
+    if source is None:
+        return None
+    return FirmwareInfo(name, source)
+
+
 # API Routes - diese müssen vor dem Static Mount stehen
 @app.get("/health")
 async def health_check():
@@ -185,17 +442,31 @@ async def health_check():
     return {"status": "healthy", "service": "WebUIFlasher"}
 
 
-@app.get("/api/firmware", response_model=list[dict])
-async def api_get_firmware():
+@app.get("/api/firmware")
+async def api_get_firmware(request: Request):
     """Get list of available firmware as JSON."""
-    firmware_list = get_firmware_list()
-    return [fw.to_dict() for fw in firmware_list]
+    # Config loading and the directory scan block, keep them off the event loop
+    payload, payload_gz, etag = await asyncio.to_thread(get_firmware_list_json)
 
+    # Compressed once when the list changes, not per request
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if payload_gz is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        payload = payload_gz
+        etag = f'{etag[:-1]}-gzip"'
+        headers["Content-Encoding"] = "gzip"
+    headers["ETag"] = etag
 
-@app.get("/api/serial-ports", response_model=list[dict])
+    # Browsers revalidate on every poll and get an empty 304 if nothing changed
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(payload, media_type="application/json", headers=headers)
+
+
+@app.get("/api/serial-ports")
 async def api_get_serial_ports():
     """Get list of available serial ports as JSON."""
-    return get_serial_ports()
+    # Port enumeration blocks, keep it off the event loop
+    return _json_response(await asyncio.to_thread(get_serial_ports))
 
 
 @app.post("/api/update-firmware")
@@ -213,6 +484,7 @@ async def api_update_firmware():
         )
 
         stdout, _ = await process.communicate()
+        _invalidate_firmware_list()
 
         if process.returncode == 0:
             return {
@@ -237,38 +509,29 @@ async def api_update_firmware():
 @app.get("/api/firmware/{name}")
 async def api_get_firmware_info(name: str):
     """Get detailed information about specific firmware."""
-    config = load_sources_config("sources.yaml")
+    firmware_info = await asyncio.to_thread(get_firmware_info, name)
+    if firmware_info is None:
+        raise HTTPException(status_code=404, detail=f"Firmware '{name}' not found")
 
-    for source in config.get("sources", []):
-        if source.get("name") == name:
-            firmware_info = FirmwareInfo(name, source)
-            return firmware_info.to_dict()
-
-    raise HTTPException(status_code=404, detail=f"Firmware '{name}' not found")
+    return _json_response(firmware_info.to_dict())
 
 
 @app.post("/api/flash", response_model=FlashResponse)
 async def api_flash_firmware(request: FlashRequest):
     """Flash firmware to ESP32 device."""
     try:
-        # Load sources config
-        config = load_sources_config("sources.yaml")
+        # Load sources config, parsing it must not stall other connections
+        config = await asyncio.to_thread(_get_config)
 
         # Check if firmware exists in config
-        firmware_found = False
-        for source in config.get("sources", []):
-            if source.get("name") == request.firmware:
-                firmware_found = True
-                break
-
-        if not firmware_found:
+        if find_firmware_config(config, request.firmware) is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"Firmware '{request.firmware}' not found in configuration",
             )
 
         # Check if firmware binary exists
-        firmware_path = Path("tmpfw") / f"{request.firmware}.bin"
+        firmware_path = _firmware_path(request.firmware)
         if not firmware_path.exists():
             raise HTTPException(
                 status_code=404,
@@ -278,8 +541,9 @@ async def api_flash_firmware(request: FlashRequest):
                 ),
             )
 
-        # Perform the flash operation
-        success = flash_firmware(
+        # Perform the flash operation, it blocks until esptool is done
+        success = await asyncio.to_thread(
+            flash_firmware,
             name=request.firmware,
             port=request.port if request.port != "auto" else None,
             baudrate=921600,  # Standard ESP32 baudrate
@@ -314,55 +578,23 @@ async def websocket_terminal(websocket: WebSocket):
     await websocket.accept()
 
     try:
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "info",
-                    "message": "🚀 WebSocket Terminal connected",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
-        )
+        await send_message(websocket, "info", "🚀 WebSocket Terminal connected")
 
         while True:
-            # Clean up finished tasks
-            await cleanup_finished_tasks()
-
             # Wait for messages from client
             data = await websocket.receive_text()
-            message = json.loads(data)
+            message = _json_loads(data)
 
             command_type = message.get("type")
 
-            if command_type == "flash":
-                await handle_flash_command(websocket, message)
-            elif command_type == "esptool":
-                await handle_esptool_command(websocket, message)
-            elif command_type == "update_firmware":
-                await handle_update_firmware_command(websocket, message)
-            elif command_type == "monitor":
-                await handle_monitor_command(websocket, message)
-            elif command_type == "stop_monitor":
-                await handle_stop_monitor_command(websocket, message)
+            handler = COMMAND_HANDLERS.get(command_type)
+            if handler is not None:
+                await handler(websocket, message)
             elif command_type == "ping":
-                await websocket.send_text(
-                    json.dumps(
-                        {
-                            "type": "pong",
-                            "message": "Terminal connection alive",
-                            "timestamp": datetime.now().isoformat(),
-                        }
-                    )
-                )
+                await send_message(websocket, "pong", "Terminal connection alive")
             else:
-                await websocket.send_text(
-                    json.dumps(
-                        {
-                            "type": "error",
-                            "message": f"Unknown command type: {command_type}",
-                            "timestamp": datetime.now().isoformat(),
-                        }
-                    )
+                await send_message(
+                    websocket, "error", f"Unknown command type: {command_type}"
                 )
 
     except WebSocketDisconnect:
@@ -373,15 +605,7 @@ async def websocket_terminal(websocket: WebSocket):
         monitor_tasks.clear()
     except Exception as e:
         print(f"Terminal error: {str(e)}")
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "error",
-                    "message": f"Terminal error: {str(e)}",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
-        )
+        await send_message(websocket, "error", f"Terminal error: {str(e)}")
 
 
 async def handle_flash_command(websocket: WebSocket, message: dict):
@@ -389,67 +613,259 @@ async def handle_flash_command(websocket: WebSocket, message: dict):
     firmware_name = message.get("firmware")
     port = message.get("port", "auto")
 
-    await websocket.send_text(
-        json.dumps(
-            {
-                "type": "command",
-                "message": f"flash firmware: {firmware_name}",
-                "timestamp": datetime.now().isoformat(),
-            }
-        )
-    )
+    await send_message(websocket, "command", f"flash firmware: {firmware_name}")
 
     try:
-        # Load config and validate firmware
-        config = load_sources_config("sources.yaml")
-
-        firmware_found = False
-        for source in config.get("sources", []):
-            if source.get("name") == firmware_name:
-                firmware_found = True
-                break
-
-        if not firmware_found:
-            await websocket.send_text(
-                json.dumps(
-                    {
-                        "type": "error",
-                        "message": (
-                            f"Firmware '{firmware_name}' not found in " "configuration"
-                        ),
-                        "timestamp": datetime.now().isoformat(),
-                    }
-                )
+        # Validate firmware config and binary in one lookup, off the event loop
+        firmware_info = await asyncio.to_thread(get_firmware_info, firmware_name)
+
+        if firmware_info is None:
+            await send_message(
+                websocket,
+                "error",
+                f"Firmware '{firmware_name}' not found in configuration",
             )
             return
 
         # Check if binary exists
-        firmware_path = Path("tmpfw") / f"{firmware_name}.bin"
-        if not firmware_path.exists():
-            await websocket.send_text(
-                json.dumps(
-                    {
-                        "type": "error",
-                        "message": f"Firmware binary not found: {firmware_path}",
-                        "timestamp": datetime.now().isoformat(),
-                    }
-                )
+        if not firmware_info.available:
+            firmware_path = _firmware_path(firmware_name)
+            await send_message(
+                websocket, "error", f"Firmware binary not found: {firmware_path}"
             )
             return
 
         # Start flashing with live output
-        await flash_with_live_output(websocket, firmware_name, port, config)
+        await flash_with_live_output(websocket, firmware_name, port)
 
     except Exception as e:
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "error",
-                    "message": f"Flash command failed: {str(e)}",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
-        )
+        await send_message(websocket, "error", f"Flash command failed: {str(e)}")
+
+
+# Upper bound of bytes taken from a subprocess pipe per read. A read returns
+# whatever is buffered, so this only limits how much one batch can hold; it
+# matches the StreamReader default buffer limit.
+_READ_SIZE = 64 * 1024
+# Minimum time between two progress updates sent to the terminal, in seconds
+_PROGRESS_INTERVAL = 0.05
+# Start of esptool's flash write progress lines
+_WRITE_PROGRESS_PREFIX = "Writing at 0x"
+# Line terminators in esptool output, a bare \r redraws a progress line
+_LINE_END_RE = re.compile(rb"\r\n|\n|\r")
+
+
+async def iter_output_frames(stream: asyncio.StreamReader):
+    """Yield lists of (text, kind) frames from subprocess output.
+
+    Each list holds the frames completed by one read, i.e. everything the
+    process has written so far. kind is "line" for newline-terminated lines
+    and "progress" for lines ended by a bare carriage return. Output is
+    split as bytes and each frame is decoded once, so only the unterminated
+    tail is kept between reads. ANSI escape sequences are removed from the
+    completed output of a read in one pass, before it is split.
+    """
+    buffer = bytearray()
+    while chunk := await stream.read(_READ_SIZE):
+        buffer += chunk
+        end = max(buffer.rfind(b"\n"), buffer.rfind(b"\r")) + 1
+        if not end:
+            continue
+        data = buffer[:end]
+        del buffer[:end]
+        if b"\x1b" in data:
+            data = _ANSI_BYTES_RE.sub(b"", data)
+
+        frames = []
+        start = 0
+        for match in _LINE_END_RE.finditer(data):
+            kind = "progress" if match.group() == b"\r" else "line"
+            text = data[start : match.start()].decode("utf-8", errors="replace")
+            frames.append((text, kind))
+            start = match.end()
+        yield frames
+
+    if buffer:
+        if b"\x1b" in buffer:
+            buffer = _ANSI_BYTES_RE.sub(b"", buffer)
+        yield [(buffer.decode("utf-8", errors="replace"), "line")]
+
+
+async def stream_esptool_output(
+    websocket: WebSocket, stream: asyncio.StreamReader, strip: bool = False
+):
+    """Stream esptool output to the WebSocket with live progress updates.
+
+    All frames available after a read go out as one batch message instead
+    of one WebSocket frame per line. The terminal overwrites progress lines,
+    so at most one per _PROGRESS_INTERVAL is sent; the latest one is held
+    back until then, or until other output has to go out after it. A held
+    update is also sent once the interval has passed without new output, so
+    the terminal does not show stale progress while esptool is busy. strip
+    removes surrounding whitespace from every line.
+    """
+    loop = asyncio.get_running_loop()
+    last_progress_line = None
+    pending_progress = None
+    progress_sent_at = float("-inf")
+
+    frames_iter = iter_output_frames(stream)
+    # The read in progress; kept across timeouts, as cancelling it would
+    # close the generator
+    next_frames = None
+    try:
+        while True:
+            if next_frames is None:
+                next_frames = asyncio.ensure_future(anext(frames_iter, None))
+            if pending_progress is not None:
+                timeout = progress_sent_at + _PROGRESS_INTERVAL - loop.time()
+                done, _ = await asyncio.wait({next_frames}, timeout=max(timeout, 0))
+                if not done:
+                    await send_message(websocket, "progress", pending_progress)
+                    pending_progress = None
+                    progress_sent_at = loop.time()
+                    continue
+            frames = await next_frames
+            next_frames = None
+            if frames is None:
+                break
+            messages = []
+            for text, kind in frames:
+                if strip:
+                    text = text.strip()
+                if not text:
+                    continue
+                if kind == "progress" or text.startswith(_WRITE_PROGRESS_PREFIX):
+                    # Carriage return or esptool's write progress, the bulk of
+                    # a flash log: no need to classify it
+                    msg_type = "progress"
+                else:
+                    msg_type = determine_message_type(text)
+
+                if msg_type == "progress":
+                    if text != last_progress_line:
+                        last_progress_line = pending_progress = text
+                    continue
+
+                if pending_progress is not None:
+                    messages.append(("progress", pending_progress))
+                    pending_progress = None
+                messages.append((msg_type, text))
+
+            if pending_progress is not None and (
+                messages or loop.time() - progress_sent_at >= _PROGRESS_INTERVAL
+            ):
+                messages.append(("progress", pending_progress))
+                pending_progress = None
+            if any(msg_type == "progress" for msg_type, _ in messages):
+                progress_sent_at = loop.time()
+
+            if len(messages) == 1:
+                await send_message(websocket, *messages[0])
+            elif messages:
+                await send_batch(websocket, messages)
+    finally:
+        if next_frames is not None:
+            next_frames.cancel()
+
+    if pending_progress is not None:
+        await send_message(websocket, "progress", pending_progress)
+
+
+class _ThreadFlowControl(asyncio.ReadTransport):
+    """Pauses a worker thread feeding a StreamReader while its buffer is full.
+
+    The StreamReader calls pause_reading/resume_reading around its buffer
+    limit, just like for a socket transport.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._resumed = threading.Event()
+        self._resumed.set()
+
+    def pause_reading(self):
+        self._resumed.clear()
+
+    def resume_reading(self):
+        self._resumed.set()
+
+    def is_reading(self) -> bool:
+        return self._resumed.is_set()
+
+    def wait_resumed(self):
+        """Block the calling thread until the reader has room again."""
+        self._resumed.wait()
+
+
+async def run_esptool_streamed(websocket: WebSocket, args: list[str]) -> int:
+    """Run esptool in a worker thread, streaming its output to the WebSocket.
+
+    esptool runs in-process, so there is no interpreter start or pipe (while
+    another client's run is active, it runs as a subprocess instead); its
+    output is handed to the event loop and goes through the same framing as
+    subprocess output. If the WebSocket can't keep up, esptool is paused
+    once _READ_SIZE * 2 bytes of output are pending instead of buffering
+    without bound.
+
+    Returns:
+        The esptool exit code (0 on success)
+    """
+    loop = asyncio.get_running_loop()
+    output = asyncio.StreamReader(limit=_READ_SIZE)
+    flow = _ThreadFlowControl()
+    output.set_transport(flow)
+    finished = False
+
+    def feed(data: bytes):
+        # Output written after the stream was closed (e.g. cancelled) is dropped
+        if not finished:
+            output.feed_data(data)
+
+    def write(text: str):
+        flow.wait_resumed()
+        loop.call_soon_threadsafe(feed, text.encode())
+
+    async def run() -> int:
+        nonlocal finished
+        try:
+            return await asyncio.to_thread(run_esptool_captured, args, write)
+        finally:
+            finished = True
+            output.feed_eof()
+
+    esptool_task = asyncio.create_task(run())
+    try:
+        await stream_esptool_output(websocket, output)
+    finally:
+        # Never leave esptool blocked on a reader that is gone
+        finished = True
+        flow.resume_reading()
+    return await esptool_task
+
+
+# esptool commands the web terminal may run. They only talk to the chip:
+# commands taking file arguments would read or write files on the server.
+ESPTOOL_WEB_COMMANDS = frozenset({"chip-id", "flash-id", "erase-flash"})
+
+
+def parse_esptool_command(command: str) -> list[str] | None:
+    """Parse a terminal esptool command of the form "[--port PORT] COMMAND".
+
+    Returns:
+        The esptool arguments, or None if the command is not allowed
+    """
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        # Unbalanced quotes
+        return None
+    command_index = 2 if args[:1] == ["--port"] else 0
+    if (
+        len(args) != command_index + 1
+        or args[command_index] not in ESPTOOL_WEB_COMMANDS
+    ):
+        return None
+    return args
 
 
 async def handle_esptool_command(websocket: WebSocket, message: dict):
@@ -457,140 +873,33 @@ async def handle_esptool_command(websocket: WebSocket, message: dict):
     command = message.get("command", "")
 
     try:
-        # Build esptool command
-        cmd = ["python", "-m", "esptool"] + command.split()
-
-        # Log the command that will be executed
-        cmd_str = " ".join(cmd)
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "command",
-                    "message": f"Executing: {cmd_str}",
-                    "timestamp": datetime.now().isoformat(),
-                }
+        # Build esptool arguments
+        args = parse_esptool_command(command)
+        if args is None:
+            await send_message(
+                websocket, "error", f"❌ Unsupported esptool command: {command}"
             )
-        )
+            return
 
-        # Execute with live output and improved parsing
-        process = await asyncio.create_subprocess_exec(
-            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        # Log the command that will be executed
+        await send_message(
+            websocket, "command", f"Executing: {format_esptool_command(args)}"
         )
 
-        # Stream output and improved parsing
-        last_progress_line = None
-        buffer = ""
-
-        while True:
-            chunk = await process.stdout.read(128)  # Smaller chunks
-            if not chunk:
-                break
-
-            try:
-                decoded_chunk = chunk.decode("utf-8")
-                buffer += decoded_chunk
-            except UnicodeDecodeError:
-                continue
-
-            # Send partial updates immediately if buffer gets substantial
-            if len(buffer) > 10 and "\n" not in buffer and "\r" not in buffer:
-                buffer_clean = clean_ansi_sequences(buffer)
-                if buffer_clean.strip() and buffer_clean != last_progress_line:
-                    await websocket.send_text(
-                        json.dumps(
-                            {
-                                "type": "partial",
-                                "message": buffer_clean,
-                                "timestamp": datetime.now().isoformat(),
-                            }
-                        )
-                    )
-
-            # Process complete lines and carriage returns
-            while "\n" in buffer or "\r" in buffer:
-                if "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    line_complete = True
-                elif "\r" in buffer:
-                    line, buffer = buffer.split("\r", 1)
-                    line_complete = False
-
-                line_clean = clean_ansi_sequences(line)
-
-                if line_complete:
-                    if line_clean:
-                        msg_type = determine_message_type(line_clean)
-
-                        # Progress messages should always overwrite, even if complete
-                        if msg_type == "progress":
-                            # Force progress type to ensure overwriting
-                            await websocket.send_text(
-                                json.dumps(
-                                    {
-                                        "type": "progress",
-                                        "message": line_clean,
-                                        "timestamp": datetime.now().isoformat(),
-                                    }
-                                )
-                            )
-                        else:
-                            await websocket.send_text(
-                                json.dumps(
-                                    {
-                                        "type": msg_type,
-                                        "message": line_clean,
-                                        "timestamp": datetime.now().isoformat(),
-                                    }
-                                )
-                            )
-                else:
-                    # Carriage return - likely progress update
-                    if line_clean and line_clean != last_progress_line:
-                        last_progress_line = line_clean
-                        await websocket.send_text(
-                            json.dumps(
-                                {
-                                    "type": "progress",
-                                    "message": line_clean,
-                                    "timestamp": datetime.now().isoformat(),
-                                }
-                            )
-                        )
-
-        # Wait for process to complete
-        await process.wait()
+        # Run esptool in-process with live output
+        returncode = await run_esptool_streamed(websocket, args)
 
-        if process.returncode == 0:
-            await websocket.send_text(
-                json.dumps(
-                    {
-                        "type": "success",
-                        "message": "✅ Command completed successfully",
-                        "timestamp": datetime.now().isoformat(),
-                    }
-                )
+        if returncode == 0:
+            await send_message(
+                websocket, "success", "✅ Command completed successfully"
             )
         else:
-            await websocket.send_text(
-                json.dumps(
-                    {
-                        "type": "error",
-                        "message": f"❌ Command failed with code {process.returncode}",
-                        "timestamp": datetime.now().isoformat(),
-                    }
-                )
+            await send_message(
+                websocket, "error", f"❌ Command failed with code {returncode}"
             )
 
     except Exception as e:
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "error",
-                    "message": f"esptool command failed: {str(e)}",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
-        )
+        await send_message(websocket, "error", f"esptool command failed: {str(e)}")
 
 
 async def handle_update_firmware_command(websocket: WebSocket, message: dict):
@@ -599,24 +908,12 @@ async def handle_update_firmware_command(websocket: WebSocket, message: dict):
     # Get the working directory for debugging
     current_dir = Path(".").absolute()
 
-    await websocket.send_text(
-        json.dumps(
-            {
-                "type": "info",
-                "message": f"Current directory: {current_dir}",
-                "timestamp": datetime.now().isoformat(),
-            }
-        )
-    )
-
-    await websocket.send_text(
-        json.dumps(
-            {
-                "type": "command",
-                "message": "Executing: uv run scripts/update_firmwares.py",
-                "timestamp": datetime.now().isoformat(),
-            }
-        )
+    await send_batch(
+        websocket,
+        [
+            ("info", f"Current directory: {current_dir}"),
+            ("command", "Executing: uv run scripts/update_firmwares.py"),
+        ],
     )
 
     try:
@@ -630,87 +927,34 @@ async def handle_update_firmware_command(websocket: WebSocket, message: dict):
             cwd=".",  # Current working directory
         )
 
-        # Stream output
-        buffer = ""
-        while True:
-            chunk = await process.stdout.read(128)
-            if not chunk:
-                break
-
-            try:
-                decoded_chunk = chunk.decode("utf-8")
-                buffer += decoded_chunk
-            except UnicodeDecodeError:
-                continue
-
-            # Process complete lines
-            while "\n" in buffer:
-                line, buffer = buffer.split("\n", 1)
-                line_clean = clean_ansi_sequences(line.strip())
-
-                if line_clean:
-                    msg_type = determine_message_type(line_clean)
-                    await websocket.send_text(
-                        json.dumps(
-                            {
-                                "type": msg_type,
-                                "message": line_clean,
-                                "timestamp": datetime.now().isoformat(),
-                            }
-                        )
-                    )
-
-        # Send remaining buffer content
-        if buffer.strip():
-            buffer_clean = clean_ansi_sequences(buffer.strip())
-            if buffer_clean:
-                await websocket.send_text(
-                    json.dumps(
-                        {
-                            "type": "output",
-                            "message": buffer_clean,
-                            "timestamp": datetime.now().isoformat(),
-                        }
-                    )
-                )
+        # Stream output with the same framing as esptool: the downloads redraw
+        # their progress bar with \r, which readline() sees as one endless line
+        try:
+            await stream_esptool_output(websocket, process.stdout, strip=True)
+        except BaseException:
+            # Don't leave the update running unattended if streaming failed
+            if process.returncode is None:
+                process.kill()
+            await process.wait()
+            raise
 
         # Wait for process to complete
         await process.wait()
+        _invalidate_firmware_list()
 
         if process.returncode == 0:
-            await websocket.send_text(
-                json.dumps(
-                    {
-                        "type": "success",
-                        "message": "✅ Firmware update completed successfully",
-                        "timestamp": datetime.now().isoformat(),
-                    }
-                )
+            await send_message(
+                websocket, "success", "✅ Firmware update completed successfully"
             )
         else:
-            await websocket.send_text(
-                json.dumps(
-                    {
-                        "type": "error",
-                        "message": (
-                            f"❌ Firmware update failed with code "
-                            f"{process.returncode}"
-                        ),
-                        "timestamp": datetime.now().isoformat(),
-                    }
-                )
+            await send_message(
+                websocket,
+                "error",
+                f"❌ Firmware update failed with code {process.returncode}",
             )
 
     except Exception as e:
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "error",
-                    "message": f"Update command failed: {str(e)}",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
-        )
+        await send_message(websocket, "error", f"Update command failed: {str(e)}")
 
 
 async def handle_monitor_command(websocket: WebSocket, message: dict):
@@ -719,56 +963,32 @@ async def handle_monitor_command(websocket: WebSocket, message: dict):
     baudrate = int(message.get("baudrate", 115200))
 
     if port == "auto":
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "error",
-                    "message": "❌ Please select a specific serial port for monitoring",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
+        await send_message(
+            websocket, "error", "❌ Please select a specific serial port for monitoring"
         )
         return
 
     # Check if already monitoring this port
     if port in monitor_tasks:
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "error",
-                    "message": f"❌ Already monitoring port {port}",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
-        )
+        await send_message(websocket, "error", f"❌ Already monitoring port {port}")
         return
 
-    await websocket.send_text(
-        json.dumps(
-            {
-                "type": "command",
-                "message": f"🔍 Starting serial monitor on {port} at {baudrate} baud",
-                "timestamp": datetime.now().isoformat(),
-            }
-        )
-    )
-
     # Start monitoring task
     task = asyncio.create_task(serial_monitor_task(websocket, port, baudrate))
     monitor_tasks[port] = task
+    task.add_done_callback(lambda t: _forget_monitor_task(port, t))
 
     # Don't await the task here - let it run in background
     # The task will be cancelled by handle_stop_monitor_command
 
-    # Send immediate confirmation that monitoring started
-    await websocket.send_text(
-        json.dumps(
-            {
-                "type": "info",
-                "message": f"🔍 Serial monitor started for {port}",
-                "timestamp": datetime.now().isoformat(),
-            }
-        )
+    # Announce and confirm the start in one message; the task only starts
+    # running (and sending) once we await here, so the order is kept
+    await send_batch(
+        websocket,
+        [
+            ("command", f"🔍 Starting serial monitor on {port} at {baudrate} baud"),
+            ("info", f"🔍 Serial monitor started for {port}"),
+        ],
     )
 
 
@@ -777,15 +997,7 @@ async def handle_stop_monitor_command(websocket: WebSocket, message: dict):
     port = message.get("port", "auto")
 
     if port == "auto" or port not in monitor_tasks:
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "error",
-                    "message": f"❌ No monitor running for port {port}",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
-        )
+        await send_message(websocket, "error", f"❌ No monitor running for port {port}")
         return
 
     # Cancel the monitoring task
@@ -802,107 +1014,107 @@ async def handle_stop_monitor_command(websocket: WebSocket, message: dict):
     except Exception as e:
         print(f"Exception while cancelling monitor task: {e}")
 
-    # Remove from tasks dict
-    if port in monitor_tasks:
-        del monitor_tasks[port]
+    # Remove from tasks dict, even if the task didn't finish cancelling yet
+    _forget_monitor_task(port, task)
 
-    await websocket.send_text(
-        json.dumps(
-            {
-                "type": "info",
-                "message": f"⏹️ Serial monitor stopped for {port}",
-                "timestamp": datetime.now().isoformat(),
-            }
-        )
-    )
+    await send_message(websocket, "info", f"⏹️ Serial monitor stopped for {port}")
+
+
+def _serial_fd(ser: serial.Serial) -> int | None:
+    """Get the file descriptor of a serial port, None if it can't be watched."""
+    try:
+        return ser.fileno()
+    except (AttributeError, OSError):
+        # Windows serial ports have no selectable file descriptor
+        return None
+
+
+# Line terminators in serial monitor output
+_NEWLINE_RE = re.compile(r"\r\n?|\n")
+# Monitor lines arriving within this many seconds are sent as one frame
+_MONITOR_BATCH_WINDOW = 0.02
+# Upper bound of lines per monitor frame
+_MONITOR_BATCH_LINES = 100
 
 
 async def serial_monitor_task(websocket: WebSocket, port: str, baudrate: int):
     """Async task for serial monitoring."""
-
+    loop = asyncio.get_running_loop()
+    ser: serial.Serial | None = None
+    fd = None
+    # Lines waiting to be sent in one frame, see _MONITOR_BATCH_WINDOW
+    batch = []
+
+    # Cancellation (stop_monitor or disconnect) raises CancelledError at the
+    # next await, the finally block below closes the port
     try:
-        # Open serial connection
-        ser = serial.Serial(port, baudrate, timeout=0.1)
-
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "success",
-                    "message": f"✅ Connected to {port} at {baudrate} baud",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
+        # Open serial connection, reads only return what is already there
+        ser = serial.Serial(port, baudrate, timeout=0)
+
+        # Let the event loop wake us when data arrives instead of polling
+        fd = _serial_fd(ser)
+        data_ready = None
+        if fd is not None:
+            data_ready = asyncio.Event()
+            loop.add_reader(fd, data_ready.set)
+
+        await send_message(
+            websocket, "success", f"✅ Connected to {port} at {baudrate} baud"
         )
 
-        buffer = ""
+        buffer = bytearray()
+        batch_deadline = 0.0
 
         while True:
-            # Check if task should be cancelled (this will raise CancelledError)
-            if asyncio.current_task().cancelled():
-                break
-
             # Read from serial port
             try:
-                if ser.in_waiting > 0:
-                    data = ser.read(ser.in_waiting)
-                    if data:
-                        try:
-                            decoded = data.decode("utf-8", errors="replace")
-                            buffer += decoded
-
-                            # Process complete lines
-                            while "\n" in buffer or "\r" in buffer:
-                                if "\n" in buffer:
-                                    line, buffer = buffer.split("\n", 1)
-                                elif "\r" in buffer:
-                                    line, buffer = buffer.split("\r", 1)
-
-                                if line.strip():
-                                    try:
-                                        await websocket.send_text(
-                                            json.dumps(
-                                                {
-                                                    "type": "monitor",
-                                                    "message": line.strip(),
-                                                    "timestamp": (
-                                                        datetime.now().isoformat()
-                                                    ),
-                                                }
-                                            )
-                                        )
-                                    except Exception:
-                                        raise  # Re-raise to break the loop
-                        except UnicodeDecodeError:
-                            # Handle binary data that can't be decoded
-                            hex_data = " ".join(f"{b:02x}" for b in data)
-
-                            try:
-                                await websocket.send_text(
-                                    json.dumps(
-                                        {
-                                            "type": "monitor",
-                                            "message": f"[HEX] {hex_data}",
-                                            "timestamp": datetime.now().isoformat(),
-                                        }
-                                    )
-                                )
-                            except Exception:
-                                raise  # Re-raise to break the loop
-
-                # Small delay to prevent CPU spinning
-                await asyncio.sleep(0.01)
+                if data_ready is not None:
+                    # Sleep until the port is readable or the batch is due
+                    timeout = max(0.0, batch_deadline - loop.time()) if batch else None
+                    try:
+                        await asyncio.wait_for(data_ready.wait(), timeout)
+                        readable = True
+                    except TimeoutError:
+                        readable = False
+                    data_ready.clear()
+                else:
+                    readable = ser.in_waiting > 0
+
+                if readable:
+                    # A port that is readable without data (unplugged adapter)
+                    # makes pyserial raise SerialException here
+                    data = ser.read(ser.in_waiting or 1)
+                    buffer += data
+
+                    # Decode all complete lines at once, keep the rest as bytes
+                    # so split UTF-8 sequences are completed by the next read
+                    end = max(buffer.rfind(b"\n"), buffer.rfind(b"\r")) + 1
+                    if end:
+                        text = buffer[:end].decode("utf-8", errors="replace")
+                        del buffer[:end]
+
+                        for line in _NEWLINE_RE.split(text):
+                            line = line.strip()
+                            if line:
+                                if not batch:
+                                    batch_deadline = loop.time() + _MONITOR_BATCH_WINDOW
+                                batch.append(line)
+                                if len(batch) >= _MONITOR_BATCH_LINES:
+                                    await send_lines(websocket, "monitor", batch)
+                                    batch = []
+
+                # Send collected lines as one frame when due
+                if batch and loop.time() >= batch_deadline:
+                    await send_lines(websocket, "monitor", batch)
+                    batch = []
+
+                if data_ready is None:
+                    # Small delay to prevent CPU spinning
+                    await asyncio.sleep(0.01)
 
             except serial.SerialException as e:
                 try:
-                    await websocket.send_text(
-                        json.dumps(
-                            {
-                                "type": "error",
-                                "message": f"❌ Serial error: {str(e)}",
-                                "timestamp": datetime.now().isoformat(),
-                            }
-                        )
-                    )
+                    await send_message(websocket, "error", f"❌ Serial error: {str(e)}")
                 except Exception:
                     print("Could not send error message via WebSocket")
                 break
@@ -912,257 +1124,193 @@ async def serial_monitor_task(websocket: WebSocket, port: str, baudrate: int):
 
     except serial.SerialException as e:
         print(f"Failed to open serial port {port}: {e}")
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "error",
-                    "message": f"❌ Could not open serial port {port}: {str(e)}",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
+        await send_message(
+            websocket, "error", f"❌ Could not open serial port {port}: {str(e)}"
         )
     except Exception as e:
         print(f"Unexpected error in serial_monitor_task: {e}")
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "error",
-                    "message": f"❌ Monitor error: {str(e)}",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
-        )
+        await send_message(websocket, "error", f"❌ Monitor error: {str(e)}")
     finally:
         # Clean up serial connection
+        if fd is not None:
+            loop.remove_reader(fd)
 
         try:
-            if "ser" in locals():
+            if ser is not None:
                 ser.close()
-
         except Exception:
             pass
 
-        # Remove from monitor_tasks if still there
-        if port in monitor_tasks:
-            del monitor_tasks[port]
+        # Lines read before the monitor stopped still belong in the terminal
+        if batch:
+            try:
+                await send_lines(websocket, "monitor", batch)
+            except Exception:
+                pass  # WebSocket already gone
 
 
-async def flash_with_live_output(
-    websocket: WebSocket, firmware_name: str, port: str, config: dict
-):
+async def flash_with_live_output(websocket: WebSocket, firmware_name: str, port: str):
     """Flash firmware with live output streaming."""
 
-    await websocket.send_text(
-        json.dumps(
-            {
-                "type": "info",
-                "message": f"🚀 Starting flash for {firmware_name}...",
-                "timestamp": datetime.now().isoformat(),
-            }
-        )
-    )
-
-    # For now, simulate the flash process by calling the existing function
-    # but we'll capture its output
-    firmware_path = Path("tmpfw") / f"{firmware_name}.bin"
+    firmware_path = _firmware_path(firmware_name)
+    args = write_flash_args(firmware_path, port if port != "auto" else None, 921600)
 
-    # Build flash command manually to get live output
-    cmd = ["python", "-m", "esptool"]
-
-    # Add port parameter first if not auto
-    if port != "auto":
-        cmd.extend(["--port", port])
-
-    # Add remaining parameters
-    cmd.extend(
+    # Announce the flash and log the command that will be executed
+    await send_batch(
+        websocket,
         [
-            "--baud",
-            "921600",
-            "write-flash",
-            "0x0",
-            str(firmware_path),
-        ]
-    )
-
-    # Log the command that will be executed
-    cmd_str = " ".join(cmd)
-    await websocket.send_text(
-        json.dumps(
-            {
-                "type": "command",
-                "message": f"Executing: {cmd_str}",
-                "timestamp": datetime.now().isoformat(),
-            }
-        )
+            ("info", f"🚀 Starting flash for {firmware_name}..."),
+            ("command", f"Executing: {format_esptool_command(args)}"),
+        ],
     )
 
     try:
-        # Execute flash command with live output
-        process = await asyncio.create_subprocess_exec(
-            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
-        )
+        # Run esptool with live output
+        returncode = await run_esptool_streamed(websocket, args)
 
-        # Stream output with chunked reading for real-time updates
-        last_progress_line = None
-        buffer = ""
-
-        while True:
-            # Read in smaller chunks for more responsive updates
-            chunk = await process.stdout.read(128)  # Smaller chunks
-            if not chunk:
-                break
-
-            # Decode chunk and add to buffer
-            try:
-                decoded_chunk = chunk.decode("utf-8")
-                buffer += decoded_chunk
-            except UnicodeDecodeError:
-                # Handle partial UTF-8 sequences
-                continue
-
-            # Send partial updates immediately if buffer gets substantial
-            if len(buffer) > 10 and "\n" not in buffer and "\r" not in buffer:
-                buffer_clean = clean_ansi_sequences(buffer)
-                if buffer_clean.strip() and buffer_clean != last_progress_line:
-                    await websocket.send_text(
-                        json.dumps(
-                            {
-                                "type": "partial",
-                                "message": buffer_clean,
-                                "timestamp": datetime.now().isoformat(),
-                            }
-                        )
-                    )
-
-            # Process complete lines and carriage returns
-            while "\n" in buffer or "\r" in buffer:
-                if "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    line_complete = True
-                elif "\r" in buffer:
-                    line, buffer = buffer.split("\r", 1)
-                    line_complete = False
-
-                # Clean ANSI escape sequences
-                line_clean = clean_ansi_sequences(line)
-
-                if line_complete:
-                    # Complete line - check if it's progress to override previous
-                    if line_clean:
-                        msg_type = determine_message_type(line_clean)
-
-                        # Progress messages should always overwrite, even if complete
-                        if msg_type == "progress":
-                            # Force progress type to ensure overwriting
-                            await websocket.send_text(
-                                json.dumps(
-                                    {
-                                        "type": "progress",
-                                        "message": line_clean,
-                                        "timestamp": datetime.now().isoformat(),
-                                    }
-                                )
-                            )
-                        else:
-                            await websocket.send_text(
-                                json.dumps(
-                                    {
-                                        "type": msg_type,
-                                        "message": line_clean,
-                                        "timestamp": datetime.now().isoformat(),
-                                    }
-                                )
-                            )
-                else:
-                    # Carriage return - likely progress update
-                    if line_clean and line_clean != last_progress_line:
-                        last_progress_line = line_clean
-                        await websocket.send_text(
-                            json.dumps(
-                                {
-                                    "type": "progress",
-                                    "message": line_clean,
-                                    "timestamp": datetime.now().isoformat(),
-                                }
-                            )
-                        )
-
-        # Send remaining buffer content at the end if any
-        if buffer.strip():
-            buffer_clean = clean_ansi_sequences(buffer)
-            if buffer_clean.strip():
-                await websocket.send_text(
-                    json.dumps(
-                        {
-                            "type": "output",
-                            "message": buffer_clean,
-                            "timestamp": datetime.now().isoformat(),
-                        }
-                    )
-                )
-
-        # Wait for process to complete
-        await process.wait()
-
-        if process.returncode == 0:
-            await websocket.send_text(
-                json.dumps(
-                    {
-                        "type": "success",
-                        "message": f"✅ {firmware_name} flashed successfully!",
-                        "timestamp": datetime.now().isoformat(),
-                    }
-                )
+        if returncode == 0:
+            await send_message(
+                websocket, "success", f"✅ {firmware_name} flashed successfully!"
             )
         else:
-            await websocket.send_text(
-                json.dumps(
-                    {
-                        "type": "error",
-                        "message": f"❌ Flash failed with code {process.returncode}",
-                        "timestamp": datetime.now().isoformat(),
-                    }
-                )
+            await send_message(
+                websocket, "error", f"❌ Flash failed with code {returncode}"
             )
 
     except Exception as e:
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "error",
-                    "message": f"Flash process failed: {str(e)}",
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
+        await send_message(websocket, "error", f"Flash process failed: {str(e)}")
+
+
+# WebSocket command handlers by message type
+COMMAND_HANDLERS = {
+    "flash": handle_flash_command,
+    "esptool": handle_esptool_command,
+    "update_firmware": handle_update_firmware_command,
+    "monitor": handle_monitor_command,
+    "stop_monitor": handle_stop_monitor_command,
+}
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves a gzipped copy (file.gz) if there is one.
+
+    The .gz files are created at image build time (see Dockerfile), so
+    nothing is compressed per request. gzip -k gives the copy the mtime of
+    its source file, so a copy with any other mtime is stale and ignored.
+    Small files are kept in memory until they change on disk, instead of
+    being read again for every request.
+    """
+
+    # Files up to this size are served from memory
+    MEMORY_MAX_SIZE = 256 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {path: ((mtime_ns, size), body)}
+        self._bodies = {}
+
+    def _file_body(self, path: str, stat_result: os.stat_result) -> bytes | None:
+        """Get the content of a small file from memory, None for large files."""
+        if stat_result.st_size > self.MEMORY_MAX_SIZE:
+            return None
+        key = (stat_result.st_mtime_ns, stat_result.st_size)
+        cached = self._bodies.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        # Only read once per change of a small local file, fine on the loop
+        with open(path, "rb") as f:
+            body = f.read()
+        self._bodies[path] = (key, body)
+        return body
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        path = str(full_path)
+        headers = None
+        if "gzip" in request_headers.get("accept-encoding", ""):
+            gz_path = f"{path}.gz"
+            try:
+                gz_stat = os.stat(gz_path)
+            except OSError:
+                gz_stat = None
+            if gz_stat and gz_stat.st_mtime_ns == stat_result.st_mtime_ns:
+                path, stat_result = gz_path, gz_stat
+                headers = {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+
+        response = FileResponse(
+            path,
+            status_code=status_code,
+            media_type=mimetypes.guess_type(str(full_path))[0],
+            headers=headers,
+            stat_result=stat_result,
         )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        # FileResponse handles range requests, the in-memory copy doesn't
+        if "range" not in request_headers:
+            body = self._file_body(path, stat_result)
+            if body is not None:
+                del response.headers["accept-ranges"]
+                return Response(body, status_code=status_code, headers=response.headers)
+        return response
+
+
+def find_site_dir() -> Path | None:
+    """Find the static files directory, from the main or the scripts directory."""
+    for candidate in (Path("scripts/site"), Path("site")):
+        if candidate.is_dir():
+            return candidate.resolve()
+    return None
 
 
 # Mount static files - das muss nach den API-Routen stehen
-site_dir = Path("scripts/site")
-if site_dir.exists():
-    app.mount("/", StaticFiles(directory=str(site_dir), html=True), name="static")
+site_dir = find_site_dir()
+if site_dir is not None:
+    print(f"📂 Serving web interface from {site_dir}")
+    # The directory was just checked, StaticFiles doesn't need to do it again
+    app.mount(
+        "/",
+        PrecompressedStaticFiles(directory=site_dir, html=True, check_dir=False),
+        name="static",
+    )
 else:
-    # Fallback: check if we're running from scripts directory
-    site_dir_fallback = Path("site")
-    if site_dir_fallback.exists():
-        app.mount(
-            "/", StaticFiles(directory=str(site_dir_fallback), html=True), name="static"
-        )
-    else:
-        print(
-            f"⚠️ Warning: Static files directory not found. "
-            f"Checked: {site_dir} and {site_dir_fallback}"
-        )
+    print(
+        "⚠️ Warning: Static files directory not found. "
+        "Checked: scripts/site and site"
+    )
 
 
-if __name__ == "__main__":
+def run():
+    """Run the web server, configured from the WEBFLASHER_* environment variables."""
     import uvicorn
 
+    host = os.getenv("WEBFLASHER_HOST", "0.0.0.0")
+    port = int(os.getenv("WEBFLASHER_PORT", "8000"))
+
     print("🚀 Starting ESP32 Firmware Flash Web Tool...")
-    print("📍 Open your browser to: http://localhost:8000")
-    print("🔧 API documentation: http://localhost:8000/docs")
+    print(f"📍 Open your browser to: http://localhost:{port}")
+    print(f"🔧 API documentation: http://localhost:{port}/docs")
     print("💡 Press Ctrl+C to stop")
 
+    # loop="auto" picks uvloop, which uvicorn[standard] installs except on Windows.
+    # httptools is installed everywhere, so the C HTTP parser is pinned.
+    # Terminal output is repetitive text, permessage-deflate shrinks it a lot.
+    # Auto-reload runs a file watcher and a separate worker process, so it is
+    # only enabled on request during development. Serial monitors and port
+    # checks are per process, so more workers are opt-in as well.
     uvicorn.run(
-        "webflasher:app", host="0.0.0.0", port=8000, reload=True, log_level="info"
+        "webflasher:app",
+        host=host,
+        port=port,
+        reload=os.getenv("WEBFLASHER_RELOAD", "").lower() in {"1", "true", "yes"},
+        workers=int(os.getenv("WEBFLASHER_WORKERS", "1")),
+        log_level="info",
+        loop="auto",
+        http="httptools",
+        ws_per_message_deflate=True,
     )
+
+
+if __name__ == "__main__":
+    run()
@@ -11,12 +11,6 @@ scripts_dir = Path(__file__).parent / "scripts"
 sys.path.insert(0, str(scripts_dir))
 
 if __name__ == "__main__":
-    import uvicorn
-    from webflasher import app
+    from webflasher import run
 
-    print("🚀 Starting ESP32 Firmware Flash Web Tool...")
-    print("📍 Open your browser to: http://localhost:8000")
-    print("🔧 API documentation: http://localhost:8000/docs")
-    print("💡 Press Ctrl+C to stop")
-
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True, log_level="info")
+    run()